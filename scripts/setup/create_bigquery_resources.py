@@ -51,15 +51,10 @@ async def create_bigquery_resources(
         # Initialize BigQuery client
         client = BigQueryClient(project_id, location)
         
-        # Create dataset
-        logger.info("Creating dataset...")
-        await client.create_dataset_if_not_exists(dataset_id)
-        logger.info(f"Dataset '{dataset_id}' created/verified successfully")
-        
-        # Create tables
-        logger.info("Creating tables...")
+        # Create dataset, tables and vector index in one script
+        logger.info("Creating dataset and tables...")
         await client.create_tables_if_not_exists(dataset_id, table_id)
-        logger.info(f"Tables created/verified successfully")
+        logger.info(f"Dataset '{dataset_id}' and tables created/verified successfully")
         
         # Verify setup
         chunk_count = await client.get_chunk_count(dataset_id, table_id)
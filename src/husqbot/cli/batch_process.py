@@ -59,12 +59,24 @@ def get_manual_parts(manual_type: str) -> List[Tuple[str, int]]:
     is_flag=True,
     help='Generate and store embeddings'
 )
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Reprocess parts even if they are unchanged'
+)
+@click.option(
+    '--streaming-inserts',
+    is_flag=True,
+    help='Use streaming inserts instead of one load job per part'
+)
 def process_all(
     project_id: str,
     location: str,
     start_from_manual: str,
     start_from_part: int,
-    store_embeddings: bool
+    store_embeddings: bool,
+    force: bool,
+    streaming_inserts: bool
 ):
     """Process all manual parts in sequence."""
     from husqbot.data.process_manuals import process_single_manual
@@ -108,7 +120,9 @@ def process_all(
                 location=location,
                 manual_type=manual_type,
                 input_file=file_name,
-                store_embeddings=store_embeddings
+                store_embeddings=store_embeddings,
+                force=force,
+                bulk_load=not streaming_inserts
             )
             msg = (
                 f"Successfully processed {manual_type} "
@@ -89,7 +89,7 @@ def generate_embeddings(
             for chunk_id, embedding in zip(chunk_ids, embeddings):
                 update_query = f"""
                 UPDATE `{table_ref}`
-                SET embedding = {embedding}
+                SET embedding = {embedding.tolist()}
                 WHERE chunk_id = '{chunk_id}'
                 """
                 client.query(update_query)
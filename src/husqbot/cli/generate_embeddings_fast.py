@@ -1,9 +1,11 @@
 import click
 import logging
+import os
 from google.cloud import bigquery
 from husqbot.models.embeddings import EmbeddingGenerator
 import time
-import json
+from typing import Iterator
+import orjson
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,6 +14,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def read_checkpoint(checkpoint_file: str) -> Iterator[str]:
+    """Yield the chunk IDs recorded in an NDJSON checkpoint file.
+    
+    Each line holds the chunk IDs of one completed batch. A checkpoint
+    written in the old single-object format is read as one line. A line
+    cut short by an interrupted run is skipped, so its batch is redone.
+    """
+    with open(checkpoint_file, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                logger.warning(f"Skipping incomplete checkpoint line: {line[:80]!r}")
+                continue
+            yield from record.get('chunk_ids', record.get('processed_chunks', []))
+
+
+def append_checkpoint(checkpoint_file: str, chunk_ids: list) -> None:
+    """Append one completed batch to the checkpoint file.
+    
+    If an interrupted run left the last line unterminated, it is closed
+    first so the new batch gets a line of its own.
+    """
+    with open(checkpoint_file, 'a+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(orjson.dumps(
+            {'chunk_ids': chunk_ids, 'last_processed': time.time()},
+            option=orjson.OPT_APPEND_NEWLINE
+        ))
+
+
 @click.command()
 @click.option(
     '--project-id',
@@ -62,12 +101,10 @@ def generate_embeddings_fast(
     # Load checkpoint if exists
     processed_chunks = set()
     try:
-        with open(checkpoint_file, 'r') as f:
-            checkpoint = json.load(f)
-            processed_chunks = set(checkpoint.get('processed_chunks', []))
-                         logger.info(
-                 f"Loaded checkpoint with {len(processed_chunks)} processed chunks"
-             )
+        processed_chunks = set(read_checkpoint(checkpoint_file))
+        logger.info(
+            f"Loaded checkpoint with {len(processed_chunks)} processed chunks"
+        )
     except FileNotFoundError:
         logger.info("No checkpoint file found, starting fresh")
     
@@ -137,19 +174,15 @@ def generate_embeddings_fast(
             WHERE t.chunk_id = temp.chunk_id
             """
             
-            # Execute update
-            client.query(update_query)
+            # Execute update and wait for it before checkpointing the batch
+            client.query(update_query).result()
             
             # Update progress tracking
             processed += len(batch)
             processed_chunks.update(chunk_ids)
             
             # Save checkpoint
-            with open(checkpoint_file, 'w') as f:
-                json.dump({
-                    'processed_chunks': list(processed_chunks),
-                    'last_processed': time.time()
-                }, f)
+            append_checkpoint(checkpoint_file, chunk_ids)
             
             logger.info(f"Updated {processed}/{total_to_process} chunks "
                        f"({processed/total_to_process*100:.1f}%)")
@@ -42,12 +42,24 @@ def cli():
     is_flag=True,
     help='Generate and store embeddings'
 )
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Reprocess the part even if it is unchanged'
+)
+@click.option(
+    '--streaming-inserts',
+    is_flag=True,
+    help='Use streaming inserts instead of one load job per part'
+)
 def process_part(
     project_id: str,
     location: str,
     manual_type: str,
     part_number: int,
-    store_embeddings: bool
+    store_embeddings: bool,
+    force: bool,
+    streaming_inserts: bool
 ):
     """Process a single part of a split manual."""
     data_dir = Path(__file__).parent.parent.parent.parent / "data"
@@ -65,7 +77,9 @@ def process_part(
         location,
         manual_type,
         input_file=str(part_file[0]),
-        store_embeddings=store_embeddings
+        store_embeddings=store_embeddings,
+        force=force,
+        bulk_load=not streaming_inserts
     )
 
 
@@ -2,18 +2,92 @@
 Main RAG system for Husqvarna 701 Enduro support.
 """
 
+import asyncio
+import copy
 import logging
-from typing import List, Dict, Optional
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple, Union
 import json
 
+import numpy as np
 from google.cloud import bigquery
 import vertexai
 from husqbot.models.embeddings import EmbeddingGenerator
+from husqbot.storage.bigquery_client import BigQueryClient
+from husqbot.storage.bigquery_setup import setup_bigquery_resources
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Queries a batch runs at once, bounding load on Vertex AI and BigQuery
+MAX_BATCH_CONCURRENCY = 8
+
+# How long a query embedding waits for others to share its Vertex AI call
+EMBEDDING_BATCH_WINDOW_SECONDS = 0.02
+
+# Answers kept for repeated queries, and for how long
+MAX_CACHED_RESPONSES = 1024
+RESPONSE_CACHE_TTL_SECONDS = 300.0
+
+# Source fields repeated across many results, shared through sys.intern
+_INTERNED_SOURCE_KEYS = ("source", "manual_type", "section")
+
+
+@dataclass(frozen=True)
+class QueryResult:
+    """Answer to a user query with its sources and scoring.
+    
+    Fields can't be reassigned, but the source rows and metadata are plain
+    dicts, so a result is not hashable.
+    """
+    
+    # Explicit until Python 3.10's dataclass(slots=True) can be required
+    __slots__ = (
+        'answer', 'sources', 'confidence', 'safety_level', 'processing_time', 'metadata'
+    )
+    
+    # Otherwise the generated hash fails on the dict fields instead
+    __hash__ = None
+    
+    answer: str
+    sources: Tuple[Dict[str, Any], ...]
+    confidence: float
+    safety_level: int
+    processing_time: float
+    metadata: Dict[str, Any]
+    
+    def __post_init__(self):
+        # A tuple with interned labels, so cached results share their
+        # repeated manual names instead of each holding a copy
+        object.__setattr__(self, 'sources', tuple(
+            {
+                key: sys.intern(value)
+                if key in _INTERNED_SOURCE_KEYS and isinstance(value, str) else value
+                for key, value in source.items()
+            }
+            for source in self.sources
+        ))
+    
+    # Slots without __dict__ leave copy and pickle to restore state through
+    # setattr, which the frozen dataclass refuses
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+def _calculate_confidence(chunks: List[Dict]) -> float:
+    """Return the mean similarity of the chunks, or 0.0 if there are none."""
+    if not chunks:
+        return 0.0
+    return round(sum(chunk['similarity'] for chunk in chunks) / len(chunks), 3)
+
 
 class HusqvarnaRAGSystem:
     """Retrieval-Augmented Generation system for Husqvarna 701 Enduro."""
@@ -24,7 +98,8 @@ class HusqvarnaRAGSystem:
         location: str = "us-central1",
         dataset_id: str = "husqvarna_rag_dataset",
         table_id: str = "document_chunks",
-        model_name: str = "gemini-1.5-flash-001"
+        model_name: str = "gemini-1.5-flash-001",
+        max_concurrency: int = MAX_BATCH_CONCURRENCY
     ):
         """Initialize the RAG system.
         
@@ -34,14 +109,28 @@ class HusqvarnaRAGSystem:
             dataset_id: BigQuery dataset ID
             table_id: BigQuery table ID
             model_name: Text generation model name
+            max_concurrency: Most queries a batch runs at once
         """
         self.project_id = project_id
         self.location = location
         self.dataset_id = dataset_id
         self.table_id = table_id
+        self.max_concurrency = max_concurrency
+        
+        # Answers by (query, skill level, max_chunks, temperature) with their
+        # expiry time, plus the ones still being computed so identical
+        # queries share them
+        self._response_cache: "OrderedDict[Tuple, Tuple[float, QueryResult]]" = (
+            OrderedDict()
+        )
+        self._pending_queries: Dict[Tuple, "asyncio.Task[QueryResult]"] = {}
+        # Queries waiting for the next embedding call, and the task making it
+        self._embedding_batch: List[Tuple[str, "asyncio.Future[np.ndarray]"]] = []
+        self._embedding_flush: Optional["asyncio.Task[None]"] = None
         
         # Initialize clients
         self.bq_client = bigquery.Client()
+        self.bigquery_client = BigQueryClient(project_id, location)
         self.embedding_generator = EmbeddingGenerator(project_id, location)
         
         # Try to initialize text generation model with fallback
@@ -64,11 +153,44 @@ class HusqvarnaRAGSystem:
         
         logger.info(f"Initialized RAG system for project {project_id}")
     
+    async def setup_complete_system(self) -> None:
+        """Create the BigQuery resources and import both manuals.
+        
+        The import reads and writes document_chunks and pdf_hashes, so
+        the dataset and its tables exist before it starts.
+        """
+        await asyncio.to_thread(
+            setup_bigquery_resources, self.project_id, self.dataset_id, self.location
+        )
+        await self._import_manuals()
+        # Answers cached before the import may be missing its chunks
+        self._response_cache.clear()
+        logger.info("System setup complete")
+    
+    async def _import_manuals(self) -> None:
+        """Chunk, embed and store the owner's and repair manuals."""
+        from husqbot.data.process_manuals import process_single_manual
+        
+        await asyncio.gather(*(
+            asyncio.to_thread(
+                process_single_manual,
+                project_id=self.project_id,
+                location=self.location,
+                manual_type=manual_type,
+                dataset_id=self.dataset_id,
+                table_id=self.table_id,
+                store_embeddings=True,
+                embedding_generator=self.embedding_generator
+            )
+            for manual_type in ("owners", "repair")
+        ))
+    
     def search_similar_chunks(
         self, 
         query: str, 
         top_k: int = 5,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """Search for similar chunks using vector similarity.
         
@@ -76,13 +198,14 @@ class HusqvarnaRAGSystem:
             query: User query
             top_k: Number of top results to return
             similarity_threshold: Minimum similarity score
+            query_embedding: Embedding of the query, if already generated
         
         Returns:
             List of similar chunks with metadata
         """
-        # Generate embedding for the query
-        logger.info(f"Generating embedding for query: {query}")
-        query_embedding = self.embedding_generator.generate_embeddings([query])[0]
+        if query_embedding is None:
+            logger.info(f"Generating embedding for query: {query}")
+            query_embedding = self.embedding_generator.generate_embeddings([query])[0]
         
         # Convert embedding to BigQuery array format
         embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
@@ -243,7 +366,8 @@ class HusqvarnaRAGSystem:
         self, 
         query: str, 
         context_chunks: List[Dict],
-        max_context_length: int = 4000  # Increased for better context
+        max_context_length: int = 4000,  # Increased for better context
+        temperature: float = 0.1
     ) -> str:
         """Generate a response using the context chunks.
         
@@ -251,6 +375,7 @@ class HusqvarnaRAGSystem:
             query: User query
             context_chunks: List of relevant chunks
             max_context_length: Maximum context length for the prompt
+            temperature: Sampling temperature of the text model
         
         Returns:
             Generated response
@@ -328,7 +453,7 @@ Generate a comprehensive, professional response:"""
         response = self.text_model.generate_content(
             prompt,
             generation_config={
-                "temperature": 0.1,  # Lower for more consistent technical info
+                "temperature": temperature,  # Low for consistent technical info
                 "max_output_tokens": 1500,  # Increased for detailed responses
                 "top_p": 0.9,
                 "top_k": 40,
@@ -411,6 +536,228 @@ Generate a comprehensive, professional response:"""
                 'fallback_mode': self.use_fallback
             }
     
+    async def query_system(
+        self,
+        query: str,
+        user_skill_level: str = "intermediate",
+        max_chunks: int = 5,
+        temperature: float = 0.1
+    ) -> QueryResult:
+        """Answer a query without blocking the event loop.
+        
+        Answers are cached for RESPONSE_CACHE_TTL_SECONDS, and an identical
+        query already in flight is awaited instead of being run a second
+        time. Every caller gets its own copy with its own processing_time.
+        
+        Args:
+            query: User's question
+            user_skill_level: beginner, intermediate or expert
+            max_chunks: Number of chunks to retrieve
+            temperature: Sampling temperature of the text model
+        
+        Returns:
+            QueryResult with the answer and its sources
+        """
+        start_time = time.perf_counter()
+        key = (query, user_skill_level, max_chunks, temperature)
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._response_cache.move_to_end(key)
+                return self._copy_result(result, start_time)
+            del self._response_cache[key]
+        
+        task = self._pending_queries.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._answer_query(query, user_skill_level, max_chunks, temperature)
+            )
+            self._pending_queries[key] = task
+            task.add_done_callback(lambda done: self._finish_query(key, done))
+        
+        # Shielded so one caller giving up doesn't cancel the others' answer
+        result = await asyncio.shield(task)
+        return self._copy_result(result, start_time)
+    
+    @staticmethod
+    def _copy_result(result: QueryResult, start_time: float) -> QueryResult:
+        """Copy a shared answer, timed from this caller's start.
+        
+        A shallow copy keeps the already interned sources, where
+        dataclasses.replace would run __post_init__ over them again.
+        """
+        copied = copy.copy(result)
+        object.__setattr__(copied, 'processing_time', time.perf_counter() - start_time)
+        object.__setattr__(copied, 'metadata', dict(result.metadata))
+        return copied
+    
+    def _finish_query(self, key: Tuple, task: "asyncio.Task[QueryResult]") -> None:
+        """Cache a completed answer and stop sharing its task.
+        
+        Answers without sources or from fallback generation are not
+        cached, so a transient BigQuery or Vertex AI failure isn't
+        served again to later callers.
+        """
+        del self._pending_queries[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        
+        result = task.result()
+        if not result.sources or result.metadata['fallback_mode']:
+            return
+        
+        self._response_cache[key] = (
+            time.monotonic() + RESPONSE_CACHE_TTL_SECONDS, result
+        )
+        if len(self._response_cache) > MAX_CACHED_RESPONSES:
+            self._response_cache.popitem(last=False)
+    
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a query together with others arriving in the same window."""
+        future = asyncio.get_running_loop().create_future()
+        self._embedding_batch.append((query, future))
+        if len(self._embedding_batch) == 1:
+            self._embedding_flush = asyncio.ensure_future(self._flush_embedding_batch())
+        return await future
+    
+    async def _flush_embedding_batch(self) -> None:
+        """Embed every query collected during the batch window in one call."""
+        await asyncio.sleep(EMBEDDING_BATCH_WINDOW_SECONDS)
+        batch, self._embedding_batch = self._embedding_batch, []
+        
+        try:
+            embeddings = await asyncio.to_thread(
+                self.embedding_generator.generate_embeddings,
+                [query for query, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+    
+    async def _answer_query(
+        self,
+        query: str,
+        user_skill_level: str,
+        max_chunks: int,
+        temperature: float
+    ) -> QueryResult:
+        """Run retrieval and generation for one query."""
+        start_time = time.perf_counter()
+        
+        query_embedding = await self._embed_query(query)
+        chunks = await asyncio.to_thread(
+            self.search_similar_chunks, query, max_chunks, query_embedding=query_embedding
+        )
+        if chunks:
+            answer = await asyncio.to_thread(
+                self.generate_response, query, chunks, temperature=temperature
+            )
+        else:
+            answer = (
+                "I couldn't find relevant information in the Husqvarna 701 "
+                "manuals for your question. Please try rephrasing your query."
+            )
+        
+        return QueryResult(
+            answer=answer,
+            sources=[
+                {
+                    'source': chunk['source'],
+                    'page': chunk['page_number'],
+                    'similarity': chunk['similarity'],
+                    'safety_level': chunk['safety_level']
+                }
+                for chunk in chunks
+            ],
+            confidence=_calculate_confidence(chunks),
+            safety_level=max((chunk['safety_level'] for chunk in chunks), default=0),
+            processing_time=time.perf_counter() - start_time,
+            metadata={
+                'user_skill_level': user_skill_level,
+                'chunks_found': len(chunks),
+                'fallback_mode': self.use_fallback
+            }
+        )
+    
+    async def batch_query(
+        self,
+        queries: List[str],
+        user_skill_level: str = "intermediate"
+    ) -> List[Union[QueryResult, Exception]]:
+        """Answer several queries concurrently, in input order.
+        
+        At most max_concurrency queries are in flight at once, so large
+        batches don't exhaust the Vertex AI quota.
+        
+        Waits for the slowest query before returning anything; use
+        batch_query_stream to handle each answer as it completes.
+        
+        Args:
+            queries: User questions
+            user_skill_level: beginner, intermediate or expert
+        
+        Returns:
+            QueryResult per query, or the exception that query raised
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def bounded_query(query: str) -> QueryResult:
+            async with semaphore:
+                return await self.query_system(
+                    query=query, user_skill_level=user_skill_level
+                )
+        
+        return await asyncio.gather(
+            *(bounded_query(query) for query in queries),
+            return_exceptions=True
+        )
+    
+    async def batch_query_stream(
+        self,
+        queries: List[str],
+        user_skill_level: str = "intermediate"
+    ) -> AsyncIterator[Tuple[int, Union[QueryResult, Exception]]]:
+        """Answer several queries concurrently, yielding each as it completes.
+        
+        Like batch_query, at most max_concurrency queries run at once.
+        
+        Args:
+            queries: User questions
+            user_skill_level: beginner, intermediate or expert
+        
+        Yields:
+            Index of the query and its QueryResult or raised exception
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def indexed_query(index: int, query: str):
+            async with semaphore:
+                try:
+                    return index, await self.query_system(
+                        query=query, user_skill_level=user_skill_level
+                    )
+                except Exception as e:
+                    return index, e
+        
+        tasks = [
+            asyncio.ensure_future(indexed_query(index, query))
+            for index, query in enumerate(queries)
+        ]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # Don't leave queries running if the caller stops early
+            for task in tasks:
+                task.cancel()
+    
     def get_system_stats(self) -> Dict:
         """Get system statistics.
         
@@ -440,12 +787,13 @@ Generate a comprehensive, professional response:"""
                 'unique_sources': result.unique_sources,
                 'avg_safety_level': round(result.avg_safety_level, 2),
                 'safety_level_range': [result.min_safety_level, result.max_safety_level],
-                'text_generation_mode': 'fallback' if self.use_fallback else 'gemini'
+                'text_generation_mode': 'fallback' if self.use_fallback else 'gemini',
+                'system_status': 'healthy'
             }
             
         except Exception as e:
             logger.error(f"Error getting system stats: {e}")
-            return {'error': str(e)} 
+            return {'system_status': 'error', 'error': str(e)} 
 
     def search_images(
         self,
@@ -0,0 +1,33 @@
+"""
+Document chunk record for Husqvarna RAG Support System.
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class Chunk:
+    """A chunk of manual text as it flows from extraction to BigQuery.
+    
+    Declaring __slots__ drops the per-instance __dict__, which matters
+    when a run holds every chunk of a manual in memory at once.
+    """
+    
+    __slots__ = (
+        'chunk_id',
+        'content',
+        'source',
+        'page_number',
+        'safety_level',
+        'created_at',
+        'embedding'
+    )
+    
+    chunk_id: str
+    content: str
+    source: str
+    page_number: int
+    safety_level: int
+    created_at: str
+    embedding: List[float]
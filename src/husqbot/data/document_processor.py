@@ -5,12 +5,14 @@ Document processing for Husqvarna RAG Support System.
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Dict
+from typing import List
 import tempfile
 import os
 
+from husqbot.data.chunk import Chunk
+
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_bytes, convert_from_path
     import pytesseract
 except ImportError:
     raise ImportError(
@@ -46,7 +48,7 @@ class DocumentProcessor:
         self.page_batch_size = page_batch_size
         self.min_chunk_size = min_chunk_size
     
-    def process_pdf(self, file_path: str) -> List[Dict]:
+    def process_pdf(self, file_path: str) -> List[Chunk]:
         """Process a PDF file and return chunks.
         
         Args:
@@ -56,7 +58,6 @@ class DocumentProcessor:
             List of chunks with metadata
         """
         logger.info(f"Opening PDF file: {file_path}")
-        chunks = []
         source = file_path.split('/')[-1]
         
         # Create a temporary directory for image files
@@ -69,43 +70,80 @@ class DocumentProcessor:
                 fmt='png',
                 thread_count=os.cpu_count() or 1
             )
+            return self._process_pages(images, source)
+    
+    def process_pdf_bytes(self, data: bytes, source: str) -> List[Chunk]:
+        """Process an in-memory PDF and return chunks.
+        
+        Args:
+            data: Raw PDF file contents
+            source: File name recorded as the source of each chunk
+        
+        Returns:
+            List of chunks with metadata
+        """
+        logger.info(f"Processing in-memory PDF: {source}")
+        
+        # Create a temporary directory for image files
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Convert PDF pages to images
+            images = convert_from_bytes(
+                data,
+                dpi=300,  # Higher DPI for better OCR
+                output_folder=temp_dir,
+                fmt='png',
+                thread_count=os.cpu_count() or 1
+            )
+            return self._process_pages(images, source)
+    
+    def _process_pages(self, images: List, source: str) -> List[Chunk]:
+        """OCR page images and split them into chunks.
+        
+        Args:
+            images: Page images in page order
+            source: File name recorded as the source of each chunk
+        
+        Returns:
+            List of chunks with metadata
+        """
+        chunks = []
+        
+        # Process each page
+        for page_num, image in enumerate(images, start=1):
+            logger.info(f"Processing page {page_num}")
             
-            # Process each page
-            for page_num, image in enumerate(images, start=1):
-                logger.info(f"Processing page {page_num}")
-                
-                # Extract text using OCR
-                text = pytesseract.image_to_string(image)
-                
-                if not text.strip():
-                    logger.warning(
-                        f"No text extracted from page {page_num}"
-                    )
-                    continue
-                
-                logger.info(
-                    f"Extracted {len(text)} characters from page {page_num}"
-                )
-                
-                # Create chunks from the page text
-                page_chunks = self._create_chunks(text)
-                logger.info(
-                    f"Created {len(page_chunks)} chunks from page {page_num}"
+            # Extract text using OCR
+            text = pytesseract.image_to_string(image)
+            
+            if not text.strip():
+                logger.warning(
+                    f"No text extracted from page {page_num}"
                 )
-                
-                # Add metadata to chunks
-                for chunk in page_chunks:
-                    if not chunk.strip():
-                        continue
-                    chunk_dict = {
-                        'chunk_id': str(uuid.uuid4()),
-                        'content': chunk,
-                        'source': source,
-                        'page_number': page_num,
-                        'safety_level': self._assess_safety(chunk),
-                        'created_at': datetime.utcnow().isoformat()
-                    }
-                    chunks.append(chunk_dict)
+                continue
+            
+            logger.info(
+                f"Extracted {len(text)} characters from page {page_num}"
+            )
+            
+            # Create chunks from the page text
+            page_chunks = self._create_chunks(text)
+            logger.info(
+                f"Created {len(page_chunks)} chunks from page {page_num}"
+            )
+            
+            # Add metadata to chunks
+            for chunk in page_chunks:
+                if not chunk.strip():
+                    continue
+                chunks.append(Chunk(
+                    chunk_id=str(uuid.uuid4()),
+                    content=chunk,
+                    source=source,
+                    page_number=page_num,
+                    safety_level=self._assess_safety(chunk),
+                    created_at=datetime.utcnow().isoformat(),
+                    embedding=[]
+                ))
         
         return chunks
     
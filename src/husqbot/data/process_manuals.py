@@ -1,17 +1,229 @@
+import hashlib
+import io
 import logging
-import json
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
+import orjson
+from google.api_core import retry
+from google.api_core.exceptions import BadRequest
 from google.cloud import bigquery
 
+from husqbot.data.chunk import Chunk
 from husqbot.data.document_processor import DocumentProcessor
 from husqbot.models.embeddings import EmbeddingGenerator
+from husqbot.storage.bigquery_client import get_bigquery_client
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PREFETCH_DEPTH = 2  # PDFs read ahead while the current one is processed
+INSERT_QUEUE_SIZE = 4  # Row batches buffered between embedding and insert
+
+# Size insert requests by payload: stay under BigQuery's 10 MB streaming
+# request limit while sending as few requests as possible
+INSERT_MAX_BYTES = 8_000_000
+INSERT_MAX_ROWS = 500
+JSON_BYTES_PER_FLOAT = 20  # e.g. "-0.012345678901234,"
+
+# Retry transient insert failures; row_ids let BigQuery drop the replays
+INSERT_RETRY = retry.Retry(predicate=retry.if_transient_error, deadline=120.0)
+
+# Columns of the document_chunks table, in schema order
+ROW_KEYS = (
+    'chunk_id',
+    'content',
+    'embedding',
+    'source',
+    'page_number',
+    'safety_level',
+    'created_at'
+)
+
+
+def _estimate_row_bytes(chunk: Chunk) -> int:
+    """Estimate the JSON size of a chunk's BigQuery row."""
+    return len(chunk.content) + len(chunk.embedding) * JSON_BYTES_PER_FLOAT
+
+
+def _get_ingest_state(
+    client: bigquery.Client,
+    table_ref: str,
+    hash_table_ref: str,
+    path: Optional[str] = None
+) -> Dict[str, Optional[str]]:
+    """Find which PDFs are already in BigQuery, in a single query.
+    
+    Args:
+        client: BigQuery client
+        table_ref: Fully-qualified chunks table
+        hash_table_ref: Fully-qualified PDF hashes table
+        path: Only look up this PDF (if None, look up all of them)
+    
+    Returns:
+        Mapping of PDF name to the SHA-256 stored on its last successful
+        run. The hash is None when rows exist without one, i.e. the
+        previous run was interrupted part-way.
+    """
+    source_filter = "WHERE source = @path" if path else ""
+    path_filter = "WHERE path = @path" if path else ""
+    # Datasets set up before hashes were tracked have no hash table yet;
+    # a script returns the rows of its last statement
+    query = f"""
+    CREATE TABLE IF NOT EXISTS `{hash_table_ref}` (
+        path STRING NOT NULL,
+        sha256 STRING NOT NULL,
+        processed_at TIMESTAMP NOT NULL
+    );
+    
+    WITH ingested AS (
+        SELECT DISTINCT source AS path
+        FROM `{table_ref}`
+        {source_filter}
+    ),
+    hashes AS (
+        SELECT path, sha256
+        FROM `{hash_table_ref}`
+        {path_filter}
+    )
+    SELECT path, hashes.sha256
+    FROM ingested
+    FULL OUTER JOIN hashes USING (path);
+    """
+    query_parameters = []
+    if path:
+        query_parameters.append(
+            bigquery.ScalarQueryParameter("path", "STRING", path)
+        )
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+    rows = client.query(query, job_config=job_config).result()
+    return {row.path: row.sha256 for row in rows}
+
+
+def _store_hash(
+    client: bigquery.Client,
+    hash_table_ref: str,
+    path: str,
+    sha256: str
+) -> None:
+    """Upsert the hash of a successfully processed PDF."""
+    query = f"""
+    MERGE `{hash_table_ref}` AS t
+    USING (SELECT @path AS path, @sha256 AS sha256) AS s
+    ON t.path = s.path
+    WHEN MATCHED THEN
+        UPDATE SET sha256 = s.sha256, processed_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN
+        INSERT (path, sha256, processed_at)
+        VALUES (s.path, s.sha256, CURRENT_TIMESTAMP())
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("path", "STRING", path),
+            bigquery.ScalarQueryParameter("sha256", "STRING", sha256)
+        ]
+    )
+    client.query(query, job_config=job_config).result()
+
+
+def _delete_source_rows(
+    client: bigquery.Client,
+    table_ref: str,
+    source: str
+) -> bool:
+    """Remove previously ingested chunks of a PDF before re-inserting it.
+    
+    Returns:
+        False if the rows are still in the streaming buffer, which DML
+        can't modify (for up to about 90 minutes after a streaming insert)
+    """
+    query = f"DELETE FROM `{table_ref}` WHERE source = @source"
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("source", "STRING", source)
+        ]
+    )
+    try:
+        client.query(query, job_config=job_config).result()
+    except BadRequest as e:
+        if "streaming buffer" not in str(e):
+            raise
+        return False
+    return True
+
+
+def _insert_worker(
+    client: bigquery.Client,
+    table_ref: str,
+    row_queue: "queue.Queue[Optional[List[Dict]]]",
+    failures: List[Exception]
+) -> None:
+    """Insert row batches from the queue until a None sentinel arrives.
+    
+    After the first failure, the worker's own or the producer's, the
+    remaining batches are drained without being inserted so the
+    producer never blocks on a full queue.
+    """
+    while True:
+        rows = row_queue.get()
+        if rows is None:
+            return
+        if failures:
+            continue
+        try:
+            errors = client.insert_rows_json(
+                table_ref,
+                rows,
+                row_ids=[row['chunk_id'] for row in rows],
+                skip_invalid_rows=False,
+                ignore_unknown_values=True,
+                retry=INSERT_RETRY
+            )
+            if errors:
+                raise RuntimeError(f"Error inserting rows: {errors}")
+        except Exception as e:
+            failures.append(e)
+
+
+def _load_worker(
+    client: bigquery.Client,
+    table_ref: str,
+    row_queue: "queue.Queue[Optional[List[Dict]]]",
+    failures: List[Exception]
+) -> None:
+    """Buffer row batches from the queue as NDJSON and load them in one job.
+    
+    Load jobs are free and take the whole PDF in a single request,
+    instead of one billed streaming insert per batch. Nothing is loaded
+    if anything was added to failures, including by the producer.
+    """
+    buffer = io.BytesIO()
+    while True:
+        rows = row_queue.get()
+        if rows is None:
+            break
+        for row in rows:
+            buffer.write(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE))
+    
+    if failures or not buffer.tell():
+        return
+    
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+    )
+    try:
+        buffer.seek(0)
+        job = client.load_table_from_file(buffer, table_ref, job_config=job_config)
+        job.result()
+    except Exception as e:
+        failures.append(e)
+
 
 def process_single_manual(
     project_id: str,
@@ -19,9 +231,15 @@ def process_single_manual(
     manual_type: str = "owners",
     dataset_id: str = "husqvarna_rag_dataset",
     table_id: str = "document_chunks",
-    batch_size: int = 5,
+    batch_size: int = 64,
     input_file: Optional[str] = None,
-    store_embeddings: bool = False
+    store_embeddings: bool = False,
+    hash_table_id: str = "pdf_hashes",
+    force: bool = False,
+    pdf_bytes: Optional[bytes] = None,
+    bulk_load: bool = True,
+    ingest_state: Optional[Dict[str, Optional[str]]] = None,
+    embedding_generator: Optional[EmbeddingGenerator] = None
 ) -> None:
     """Process a single manual or part of a manual.
     
@@ -31,14 +249,41 @@ def process_single_manual(
         manual_type: Type of manual (owners/repair)
         dataset_id: BigQuery dataset ID
         table_id: BigQuery table ID
-        batch_size: Number of chunks to process at once
+        batch_size: Number of chunks to embed at once; a few times the
+            generator's max_workers keeps all of its requests in flight
         input_file: Specific PDF file to process (if None, process all)
         store_embeddings: Whether to generate and store embeddings
+        hash_table_id: BigQuery table tracking the SHA-256 of processed PDFs
+        force: Reprocess PDFs even if their hash is unchanged
+        pdf_bytes: Contents of input_file if already read (e.g. prefetched)
+        bulk_load: Write each PDF with one load job instead of streaming
+            inserts per batch
+        ingest_state: Result of _get_ingest_state for the whole table, so
+            per-file calls don't each query BigQuery
+        embedding_generator: Generator to embed with; one is created, and
+            closed when done, if store_embeddings is set without one
     """
+    if store_embeddings and embedding_generator is None:
+        # Shared by every PDF of a directory, then its threads shut down
+        with EmbeddingGenerator(project_id, location) as embedding_generator:
+            return process_single_manual(
+                project_id=project_id,
+                location=location,
+                manual_type=manual_type,
+                dataset_id=dataset_id,
+                table_id=table_id,
+                batch_size=batch_size,
+                input_file=input_file,
+                store_embeddings=store_embeddings,
+                hash_table_id=hash_table_id,
+                force=force,
+                pdf_bytes=pdf_bytes,
+                bulk_load=bulk_load,
+                ingest_state=ingest_state,
+                embedding_generator=embedding_generator
+            )
+    
     doc_processor = DocumentProcessor()
-    embedding_generator = None
-    if store_embeddings:
-        embedding_generator = EmbeddingGenerator(project_id, location)
     
     # Get the data directory
     data_dir = Path(__file__).parent.parent.parent.parent / "data"
@@ -47,70 +292,142 @@ def process_single_manual(
     # Process the specified file
     if input_file:
         pdf_file = split_dir / input_file
-        logger.info(f"Processing {pdf_file}...")
+        client = get_bigquery_client(project_id)
+        table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        hash_table_ref = f"{project_id}.{dataset_id}.{hash_table_id}"
         
-        # Extract chunks
-        chunks = doc_processor.process_pdf(str(pdf_file))
+        if pdf_bytes is None:
+            pdf_bytes = pdf_file.read_bytes()
         
-        # Create a temporary file to store chunks
-        temp_dir = data_dir / "processed" / "temp"
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        temp_file = temp_dir / f"{pdf_file.stem}_chunks.json"
+        if ingest_state is None:
+            ingest_state = _get_ingest_state(
+                client, table_ref, hash_table_ref, pdf_file.name
+            )
         
-        # Save chunks to temporary file
-        with open(temp_file, 'w') as f:
-            json.dump(chunks, f)
+        # Skip PDFs that have not changed since they were last ingested
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        ingested = pdf_file.name in ingest_state
+        if ingested and ingest_state[pdf_file.name] == pdf_hash and not force:
+            logger.info(f"Skipping {pdf_file.name}: unchanged since last run")
+            return
         
-        # Process chunks in batches
-        client = bigquery.Client()
-        table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        logger.info(f"Processing {pdf_file}...")
         
-        with open(temp_file, 'r') as f:
-            chunks = json.load(f)
+        # Drop rows left by a previous version or an interrupted run. Rows
+        # that can't be deleted yet are left alone rather than duplicated;
+        # no hash is stored, so a later run replaces them.
+        if ingested and not _delete_source_rows(client, table_ref, pdf_file.name):
+            logger.warning(
+                f"Skipping {pdf_file.name}: its previous rows are still in "
+                f"BigQuery's streaming buffer and can't be replaced yet; "
+                f"re-run the ingest later"
+            )
+            return
+        
+        # Extract chunks
+        chunks = doc_processor.process_pdf_bytes(pdf_bytes, pdf_file.name)
+        
+        # Embed batches here while a worker thread writes the previous
+        # ones out, so Vertex AI and BigQuery work overlap
+        row_queue: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(
+            maxsize=INSERT_QUEUE_SIZE
+        )
+        failures: List[Exception] = []
+        inserter = threading.Thread(
+            target=_load_worker if bulk_load else _insert_worker,
+            args=(client, table_ref, row_queue, failures),
+            daemon=True
+        )
+        inserter.start()
+        
+        rows: List[Dict] = []
+        rows_bytes = 0
+        try:
             for i in range(0, len(chunks), batch_size):
+                if failures:
+                    break
                 batch = chunks[i:i + batch_size]
                 
                 if store_embeddings and embedding_generator:
-                    texts = [chunk['content'] for chunk in batch]
+                    texts = [chunk.content for chunk in batch]
                     embeddings = embedding_generator.generate_embeddings(texts)
+                    # BigQuery's JSON insert API needs plain floats
                     for chunk, embedding in zip(batch, embeddings):
-                        chunk['embedding'] = embedding
-                else:
-                    for chunk in batch:
-                        chunk['embedding'] = []
+                        chunk.embedding = embedding.tolist()
                 
-                # Prepare rows for BigQuery
-                rows = []
+                # Prepare rows for BigQuery, sending them on in requests
+                # sized by payload rather than by embedding batch
                 for chunk in batch:
-                    row = {
-                        'chunk_id': chunk['chunk_id'],
-                        'content': chunk['content'],
-                        'embedding': chunk['embedding'],
-                        'source': chunk['source'],
-                        'page_number': chunk['page_number'],
-                        'safety_level': chunk['safety_level'],
-                        'created_at': chunk['created_at']
-                    }
-                    rows.append(row)
-                
-                # Insert into BigQuery
-                errors = client.insert_rows_json(table_ref, rows)
-                if errors:
-                    raise RuntimeError(f"Error inserting rows: {errors}")
+                    rows.append({key: getattr(chunk, key) for key in ROW_KEYS})
+                    rows_bytes += _estimate_row_bytes(chunk)
+                    if (rows_bytes >= INSERT_MAX_BYTES or
+                            len(rows) >= INSERT_MAX_ROWS):
+                        row_queue.put(rows)
+                        rows, rows_bytes = [], 0
+            
+            if rows and not failures:
+                row_queue.put(rows)
+        except BaseException as e:
+            # Have the worker drop what it buffered: without its hash a
+            # partial PDF would be served until a later run replaces it
+            failures.append(e)
+            raise
+        finally:
+            row_queue.put(None)
+            inserter.join()
+        
+        if failures:
+            raise failures[0]
         
-        # Clean up temporary file
-        temp_file.unlink()
+        # Record the hash only once every batch has been inserted
+        _store_hash(client, hash_table_ref, pdf_file.name, pdf_hash)
+        logger.info(f"Stored {len(chunks)} chunks from {pdf_file.name}")
     else:
         # Process all files in the directory
         pdf_files = sorted(split_dir.glob("*.pdf"))
-        for pdf_file in pdf_files:
-            process_single_manual(
-                project_id=project_id,
-                location=location,
-                manual_type=manual_type,
-                dataset_id=dataset_id,
-                table_id=table_id,
-                batch_size=batch_size,
-                input_file=pdf_file.name,
-                store_embeddings=store_embeddings
-            ) 
\ No newline at end of file
+        
+        # Look up every PDF's ingest state with one query up front
+        client = get_bigquery_client(project_id)
+        ingest_state = _get_ingest_state(
+            client,
+            f"{project_id}.{dataset_id}.{table_id}",
+            f"{project_id}.{dataset_id}.{hash_table_id}"
+        )
+        completed = sum(
+            1 for pdf_file in pdf_files
+            if ingest_state.get(pdf_file.name) is not None
+        )
+        logger.info(
+            f"{completed} of {len(pdf_files)} PDFs were fully ingested "
+            f"before; unchanged ones will be skipped"
+        )
+        
+        # Read the next few PDFs from disk while the current one is OCR'd
+        with ThreadPoolExecutor(max_workers=PREFETCH_DEPTH) as executor:
+            pending = deque(
+                executor.submit(pdf_file.read_bytes)
+                for pdf_file in pdf_files[:PREFETCH_DEPTH]
+            )
+            for i, pdf_file in enumerate(pdf_files):
+                pdf_bytes = pending.popleft().result()
+                if i + PREFETCH_DEPTH < len(pdf_files):
+                    pending.append(
+                        executor.submit(pdf_files[i + PREFETCH_DEPTH].read_bytes)
+                    )
+                
+                process_single_manual(
+                    project_id=project_id,
+                    location=location,
+                    manual_type=manual_type,
+                    dataset_id=dataset_id,
+                    table_id=table_id,
+                    batch_size=batch_size,
+                    input_file=pdf_file.name,
+                    store_embeddings=store_embeddings,
+                    hash_table_id=hash_table_id,
+                    force=force,
+                    pdf_bytes=pdf_bytes,
+                    bulk_load=bulk_load,
+                    ingest_state=ingest_state,
+                    embedding_generator=embedding_generator
+                ) 
\ No newline at end of file
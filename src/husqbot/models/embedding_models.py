@@ -2,29 +2,40 @@
 Embedding models for Husqvarna RAG Support System.
 """
 
+import asyncio
 import logging
 from typing import List, Optional
+
+import numpy as np
 from vertexai.generative_models import GenerativeModel
 
 logger = logging.getLogger(__name__)
 
+MAX_CONCURRENT_REQUESTS = 16
+
 
 class EmbeddingModel:
     """Handles text embedding generation using Vertex AI."""
     
-    def __init__(self, model_name: str = "textembedding-gecko@003"):
+    def __init__(
+        self,
+        model_name: str = "textembedding-gecko@003",
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS
+    ):
         """
         Initialize the embedding model.
         
         Args:
             model_name: Name of the embedding model to use
+            max_concurrency: Maximum number of embedding requests in flight
         """
         self.model_name = model_name
+        self.max_concurrency = max_concurrency
         self.model = GenerativeModel(model_name)
         
         logger.info(f"Initialized embedding model: {model_name}")
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text.
         
@@ -32,17 +43,18 @@ class EmbeddingModel:
             text: Text to embed
             
         Returns:
-            Embedding vector
+            Embedding vector as a float32 array
         """
         try:
-            response = self.model.predict(text)
-            embedding = response.embeddings[0].values
+            # predict() blocks, so run it off the event loop
+            response = await asyncio.to_thread(self.model.predict, text)
+            embedding = np.asarray(response.embeddings[0].values, dtype=np.float32)
             return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise
     
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         Generate embeddings for multiple texts.
         
@@ -50,31 +62,43 @@ class EmbeddingModel:
             texts: List of texts to embed
             
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dimension)
         """
-        embeddings = []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        completed = 0
+        
+        async def embed_one(i: int, text: str) -> np.ndarray:
+            nonlocal completed
+            async with semaphore:
+                try:
+                    embedding = await self.generate_embedding(text)
+                except Exception as e:
+                    logger.error(f"Error generating embedding for text {i}: {e}")
+                    # Return zero vector as fallback
+                    embedding = np.zeros(
+                        self.get_embedding_dimension(), dtype=np.float32
+                    )
+            
+            # Log progress for large batches
+            completed += 1
+            if completed % 10 == 0:
+                logger.info(f"Generated embeddings for {completed}/{len(texts)} texts")
+            return embedding
         
-        for i, text in enumerate(texts):
-            try:
-                embedding = await self.generate_embedding(text)
-                embeddings.append(embedding)
-                
-                # Log progress for large batches
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Generated embeddings for {i + 1}/{len(texts)} texts")
-                    
-            except Exception as e:
-                logger.error(f"Error generating embedding for text {i}: {e}")
-                # Return zero vector as fallback
-                embeddings.append([0.0] * 768)
+        # gather() keeps results in input order
+        embeddings = await asyncio.gather(
+            *(embed_one(i, text) for i, text in enumerate(texts))
+        )
         
-        return embeddings
+        if not embeddings:
+            return np.empty((0, self.get_embedding_dimension()), dtype=np.float32)
+        return np.vstack(embeddings)
     
     async def generate_embeddings_batch(
         self, 
         texts: List[str], 
         batch_size: int = 10
-    ) -> List[List[float]]:
+    ) -> np.ndarray:
         """
         Generate embeddings in batches for efficiency.
         
@@ -83,18 +107,20 @@ class EmbeddingModel:
             batch_size: Size of each batch
             
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dimension)
         """
         all_embeddings = []
         
         for i in range(0, len(texts), batch_size):
             batch = texts[i:i + batch_size]
             batch_embeddings = await self.generate_embeddings(batch)
-            all_embeddings.extend(batch_embeddings)
+            all_embeddings.append(batch_embeddings)
             
             logger.info(f"Processed batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
         
-        return all_embeddings
+        if not all_embeddings:
+            return np.empty((0, self.get_embedding_dimension()), dtype=np.float32)
+        return np.vstack(all_embeddings)
     
     def get_embedding_dimension(self) -> int:
         """
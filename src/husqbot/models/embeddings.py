@@ -1,64 +1,149 @@
+import functools
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
 
+import numpy as np
 import vertexai
+from google.api_core import retry
+from google.api_core.exceptions import ResourceExhausted
 from vertexai.language_models import TextEmbeddingModel
 
+if TYPE_CHECKING:
+    from husqbot.data.chunk import Chunk
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_DIMENSION = 768  # Default dimension
+
+# Back off exponentially when the embedding quota is exhausted (HTTP 429)
+_retry_on_quota = retry.Retry(
+    predicate=retry.if_exception_type(ResourceExhausted),
+    initial=1.0,
+    maximum=60.0,
+    multiplier=2.0,
+    timeout=300.0
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_model(
+    project_id: str,
+    location: str,
+    model_name: str
+) -> TextEmbeddingModel:
+    """Initialize Vertex AI and load an embedding model once per process."""
+    vertexai.init(project=project_id, location=location)
+    logger.info(f"Initializing embedding model: {model_name}")
+    return TextEmbeddingModel.from_pretrained(model_name)
+
 
 class EmbeddingGenerator:
-    def __init__(self, project_id: str, location: str = "us-central1"):
+    def __init__(
+        self,
+        project_id: str,
+        location: str = "us-central1",
+        max_workers: int = 16
+    ):
         """Initialize the embedding generator.
         
         Args:
             project_id: Google Cloud project ID
             location: Google Cloud region
+            max_workers: Number of embedding requests to keep in flight
         """
-        vertexai.init(project=project_id, location=location)
         # Updated to use the current gemini embedding model
         model_name = "gemini-embedding-001"
-        logger.info(f"Initializing embedding model: {model_name}")
-        self.model = TextEmbeddingModel.from_pretrained(model_name)
+        self.model = _get_model(project_id, location, model_name)
+        # gemini-embedding-001 accepts one input per request
+        self.batch_size = 1
+        self.max_workers = max_workers
+        # One pool for the generator's lifetime rather than one per call
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+    
+    def close(self) -> None:
+        """Shut down the request threads once in-flight calls finish."""
+        self._executor.shutdown(wait=True)
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def __enter__(self) -> "EmbeddingGenerator":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def _embed_batch(self, batch: List[str]) -> List[np.ndarray]:
+        """Embed one request-sized batch of texts."""
+        try:
+            batch_embeddings = _retry_on_quota(self.model.get_embeddings)(batch)
+            return [
+                np.asarray(emb.values, dtype=np.float32)
+                for emb in batch_embeddings
+            ]
+        except Exception as e:
+            logger.error(f"Error generating embedding for text: {e}")
+            # Add zero vectors as placeholders for failed embeddings
+            return [
+                np.zeros(EMBEDDING_DIMENSION, dtype=np.float32) for _ in batch
+            ]
+    
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """Generate embeddings for a list of texts.
         
         Args:
             texts: List of text strings to embed
         
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dimension); call .tolist()
+            on a row where JSON floats are needed (e.g. BigQuery inserts)
         """
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        
+        # Each request is a separate HTTPS round-trip, so keep several in
+        # flight at once; map() preserves the input order
         embeddings = []
-        # Process texts individually since gemini-embedding-001 
-        # accepts one input at a time
-        for text in texts:
-            try:
-                batch_embeddings = self.model.get_embeddings([text])
-                embeddings.extend([emb.values for emb in batch_embeddings])
-            except Exception as e:
-                logger.error(f"Error generating embedding for text: {e}")
-                # Add a zero vector as placeholder for failed embeddings
-                embeddings.append([0.0] * 768)  # Default dimension
+        for batch_embeddings in self._executor.map(self._embed_batch, batches):
+            embeddings.extend(batch_embeddings)
         
-        return embeddings
+        if not embeddings:
+            return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        return np.vstack(embeddings)
     
-    def generate_embeddings_for_chunks(self, chunks: List[dict]) -> List[dict]:
+    def generate_embeddings_for_chunks(
+        self,
+        chunks: List["Chunk"]
+    ) -> List["Chunk"]:
         """Generate embeddings for document chunks.
         
         Args:
-            chunks: List of chunk dictionaries with 'content' field
+            chunks: List of chunks from DocumentProcessor.process_pdf
         
         Returns:
-            List of chunks with 'embedding' field added
+            The same chunks with 'embedding' set to a list of floats
         """
-        texts = [chunk['content'] for chunk in chunks]
-        embeddings = self.generate_embeddings(texts)
+        # Manuals repeat boilerplate (warnings, headers) across pages, so
+        # embed each distinct text once and share the vector between chunks
+        unique_positions = {}
+        positions = []
+        for chunk in chunks:
+            positions.append(
+                unique_positions.setdefault(chunk.content, len(unique_positions))
+            )
+        
+        if len(unique_positions) < len(chunks):
+            logger.info(
+                f"Embedding {len(unique_positions)} unique texts "
+                f"for {len(chunks)} chunks"
+            )
+        embeddings = self.generate_embeddings(list(unique_positions))
         
-        for chunk, embedding in zip(chunks, embeddings):
-            chunk['embedding'] = embedding
+        # Chunk.embedding holds plain floats, as BigQuery's JSON insert
+        # API needs them
+        for chunk, position in zip(chunks, positions):
+            chunk.embedding = embeddings[position].tolist()
         
         return chunks 
\ No newline at end of file
@@ -2,13 +2,216 @@
 BigQuery client for Husqvarna RAG Support System.
 """
 
+import asyncio
+import functools
+import io
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import re
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from google.api_core import retry
 from google.cloud import bigquery
+from google.cloud import bigquery_storage_v1
+from google.cloud.bigquery_storage_v1 import types, writer
 from google.cloud.exceptions import NotFound, Conflict
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
 
 logger = logging.getLogger(__name__)
 
+# HTTP connections kept per BigQuery client; queries run concurrently from
+# worker threads and the requests default of 10 would make them queue
+HTTP_POOL_SIZE = 32
+
+# OAuth scopes of the credentials behind the shared BigQuery session
+BIGQUERY_SCOPES = (
+    "https://www.googleapis.com/auth/bigquery",
+    "https://www.googleapis.com/auth/cloud-platform",
+)
+
+# Below this many rows a plain streaming insert is cheaper than opening
+# a Storage Write API stream
+STORAGE_WRITE_MIN_ROWS = 500
+
+# AppendRows requests are capped at 10 MB; leave headroom for metadata
+STORAGE_WRITE_MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
+# Bounds on the IVF index's num_lists, which is sized as sqrt(row count);
+# BigQuery rejects indexes with more than 5000 lists
+IVF_MIN_LISTS = 16
+IVF_MAX_LISTS = 5000
+
+# Share of IVF lists probed per search (BigQuery's nprobe analogue).
+# The default favours latency, probing 1 in 20 lists; raise it toward
+# 0.125 (num_lists / 8 probes) where recall matters more than speed.
+DEFAULT_FRACTION_LISTS_TO_SEARCH = 0.05
+
+# Query embeddings sent per batched VECTOR_SEARCH job
+SEARCH_BATCH_SIZE = 16
+
+# Table IDs are interpolated into SQL (they cannot be query parameters),
+# so only plain identifier characters are accepted
+_TABLE_FQN_PATTERN = re.compile(r"^[A-Za-z0-9_\-.]+$")
+
+# Chunk types returned when a search asks for safety content
+SAFETY_CHUNK_TYPES = ["warning", "safety"]
+
+_FIELD = descriptor_pb2.FieldDescriptorProto
+
+# Protobuf layout of a manual_chunks row for the Storage Write API.
+# TIMESTAMP columns are sent as microseconds since the epoch.
+_MANUAL_CHUNK_ROW_FIELDS = (
+    ("id", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("section", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("section_upper", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("subsection", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("content", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("page_number", _FIELD.TYPE_INT64, _FIELD.LABEL_OPTIONAL),
+    ("chunk_type", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("manual_type", _FIELD.TYPE_STRING, _FIELD.LABEL_OPTIONAL),
+    ("embedding", _FIELD.TYPE_DOUBLE, _FIELD.LABEL_REPEATED),
+    ("created_at", _FIELD.TYPE_INT64, _FIELD.LABEL_OPTIONAL),
+    ("updated_at", _FIELD.TYPE_INT64, _FIELD.LABEL_OPTIONAL),
+)
+
+
+# Arrow layout of a manual_chunks row for Parquet loads. Modes must match
+# the table: a load may not relax a REQUIRED column to NULLABLE.
+_MANUAL_CHUNKS_ARROW_SCHEMA = pa.schema([
+    pa.field("id", pa.string(), nullable=False),
+    pa.field("section", pa.string()),
+    pa.field("section_upper", pa.string()),
+    pa.field("subsection", pa.string()),
+    pa.field("content", pa.string(), nullable=False),
+    pa.field("page_number", pa.int64()),
+    pa.field("chunk_type", pa.string()),
+    pa.field("manual_type", pa.string()),
+    pa.field("embedding", pa.list_(pa.float32())),
+    pa.field("created_at", pa.timestamp("us", tz="UTC")),
+    pa.field("updated_at", pa.timestamp("us", tz="UTC")),
+])
+
+
+@functools.lru_cache(maxsize=1)
+def _manual_chunk_row_class():
+    """Build the protobuf message class for manual_chunks rows."""
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="manual_chunk_row.proto",
+        package="husqbot",
+        syntax="proto2"
+    )
+    message_proto = file_proto.message_type.add(name="ManualChunkRow")
+    for number, (name, field_type, label) in enumerate(_MANUAL_CHUNK_ROW_FIELDS, 1):
+        message_proto.field.add(name=name, number=number, type=field_type, label=label)
+    
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return message_factory.GetMessageClass(
+        pool.FindMessageTypeByName("husqbot.ManualChunkRow")
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_bigquery_client(project_id: str, location: Optional[str] = None) -> bigquery.Client:
+    """
+    Return the process-wide BigQuery client for a project and location.
+    
+    Sharing one client reuses its authenticated session and keep-alive
+    connections instead of opening new ones per instance.
+    
+    Args:
+        project_id: Google Cloud project ID
+        location: Default location for jobs
+        
+    Returns:
+        Shared BigQuery client
+    """
+    # Build the session ourselves to size its pool, rather than reaching
+    # into the client's private one
+    credentials, _ = google.auth.default(scopes=BIGQUERY_SCOPES)
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE
+    ))
+    return bigquery.Client(
+        project=project_id,
+        location=location,
+        credentials=credentials,
+        _http=session
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_read_client() -> bigquery_storage_v1.BigQueryReadClient:
+    """Return the process-wide Storage Read API client."""
+    return bigquery_storage_v1.BigQueryReadClient()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_write_client() -> bigquery_storage_v1.BigQueryWriteClient:
+    """Return the process-wide Storage Write API client."""
+    return bigquery_storage_v1.BigQueryWriteClient()
+
+
+def _manual_chunks_arrow_table(
+    chunks: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    now: datetime
+) -> pa.Table:
+    """
+    Build manual_chunks rows as an Arrow table, column by column.
+    
+    The embedding column wraps the NumPy buffer without a per-row copy.
+    
+    Args:
+        chunks: List of chunk dictionaries
+        embeddings: float32 embeddings, shape (n, dimension)
+        now: Timestamp for created_at and updated_at
+        
+    Returns:
+        Arrow table in _MANUAL_CHUNKS_ARROW_SCHEMA
+    """
+    num_rows, dimension = embeddings.shape
+    sections = pa.array([chunk.get("section") for chunk in chunks], pa.string())
+    timestamps = pa.array([now] * num_rows, pa.timestamp("us", tz="UTC"))
+    
+    return pa.table({
+        "id": pa.array([chunk.get("id") for chunk in chunks], pa.string()),
+        "section": sections,
+        "section_upper": pc.utf8_upper(sections),
+        "subsection": pa.array([chunk.get("subsection") for chunk in chunks], pa.string()),
+        "content": pa.array([chunk.get("content") for chunk in chunks], pa.string()),
+        "page_number": pa.array([chunk.get("page_number") for chunk in chunks], pa.int64()),
+        "chunk_type": pa.array([chunk.get("chunk_type") for chunk in chunks], pa.string()),
+        "manual_type": pa.array(
+            [chunk.get("manual_type", "owners") for chunk in chunks], pa.string()
+        ),
+        "embedding": pa.FixedSizeListArray.from_arrays(
+            pa.array(embeddings.ravel()), dimension
+        ).cast(pa.list_(pa.float32())),
+        "created_at": timestamps,
+        "updated_at": timestamps,
+    }, schema=_MANUAL_CHUNKS_ARROW_SCHEMA)
+
+
+def _ivf_num_lists(row_count: int) -> int:
+    """Return the IVF list count for a table: sqrt(N), clamped."""
+    return max(IVF_MIN_LISTS, min(IVF_MAX_LISTS, int(round(math.sqrt(row_count)))))
+
+
+def _timestamp_micros(value: datetime) -> int:
+    """Convert a naive UTC datetime to microseconds since the epoch."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
 
 class BigQueryClient:
     """BigQuery client for managing manual chunks and embeddings."""
@@ -23,10 +226,74 @@ class BigQueryClient:
         """
         self.project_id = project_id
         self.location = location
-        self.client = bigquery.Client(project=project_id)
+        self.client = get_bigquery_client(project_id, location)
+        # Large query results are downloaded over the Storage Read API
+        self.read_client = _get_read_client()
         
         logger.info(f"Initialized BigQuery client for project {project_id}")
     
+    def _table_fqn(self, dataset_id: str, table_id: str) -> str:
+        """Return the fully-qualified table ID, rejecting unsafe names."""
+        table_fqn = f"{self.project_id}.{dataset_id}.{table_id}"
+        if not _TABLE_FQN_PATTERN.fullmatch(table_fqn):
+            raise ValueError(f"Invalid table ID: {table_fqn!r}")
+        return table_fqn
+    
+    def _run_query_sync(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None
+    ) -> List[bigquery.Row]:
+        """Run a query and fetch every result row (blocking)."""
+        query_job = self.client.query(query, job_config=job_config, location=self.location)
+        return list(query_job.result())
+    
+    async def _run_query(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None
+    ) -> List[bigquery.Row]:
+        """
+        Run a query in a worker thread so the event loop stays free.
+        
+        Args:
+            query: SQL to run
+            job_config: Optional query job configuration
+            
+        Returns:
+            All result rows
+        """
+        return await asyncio.to_thread(self._run_query_sync, query, job_config)
+    
+    def _run_query_arrow_sync(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None
+    ) -> pa.Table:
+        """Run a query and download its results as Arrow (blocking)."""
+        query_job = self.client.query(query, job_config=job_config, location=self.location)
+        return query_job.to_arrow(bqstorage_client=self.read_client)
+    
+    async def _run_query_arrow(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None
+    ) -> pa.Table:
+        """
+        Run a query in a worker thread and return the results as Arrow.
+        
+        Results are decoded column-wise in native code rather than
+        wrapped row by row.
+        
+        Args:
+            query: SQL to run
+            job_config: Optional query job configuration
+            
+        Returns:
+            Query results as a pyarrow Table
+        """
+        return await asyncio.to_thread(self._run_query_arrow_sync, query, job_config)
+    
     async def create_dataset_if_not_exists(self, dataset_id: str = "husqvarna_rag_dataset") -> None:
         """
         Create BigQuery dataset if it doesn't exist.
@@ -39,7 +306,7 @@ class BigQueryClient:
         try:
             dataset = bigquery.Dataset(dataset_ref)
             dataset.location = self.location
-            dataset = self.client.create_dataset(dataset)
+            dataset = await asyncio.to_thread(self.client.create_dataset, dataset)
             logger.info(f"Created dataset: {self.project_id}.{dataset_id}")
         except Conflict:
             logger.info(f"Dataset {dataset_id} already exists")
@@ -53,61 +320,122 @@ class BigQueryClient:
         table_id: str = "manual_chunks"
     ) -> None:
         """
-        Create BigQuery tables if they don't exist.
+        Create the dataset, chunk table and vector index if they don't exist.
+        
+        The DDL statements run as one script, so setup costs a
+        single job. An existing table gets any columns added since it
+        was created. A new index gets num_lists sized from the rows
+        already in the table.
         
         Args:
             dataset_id: Dataset ID
             table_id: Table ID for manual chunks
         """
-        # Create manual chunks table
-        await self._create_manual_chunks_table(dataset_id, table_id)
+        dataset_fqn = f"{self.project_id}.{dataset_id}"
+        table_fqn = self._table_fqn(dataset_id, table_id)
         
-        # Create vector index
-        await self._create_vector_index(dataset_id, table_id)
-    
-    async def _create_manual_chunks_table(self, dataset_id: str, table_id: str) -> None:
-        """Create table to store manual chunks with embeddings."""
-        
-        schema = [
-            bigquery.SchemaField("id", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("section", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("subsection", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("content", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("page_number", "INTEGER", mode="NULLABLE"),
-            bigquery.SchemaField("chunk_type", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("manual_type", "STRING", mode="NULLABLE"),  # owners, repair
-            bigquery.SchemaField("embedding", "REPEATED FLOAT", mode="NULLABLE"),
-            bigquery.SchemaField("created_at", "TIMESTAMP", mode="NULLABLE"),
-            bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE"),
-        ]
+        script = f"""
+        DECLARE add_section_upper BOOL;
+        
+        CREATE SCHEMA IF NOT EXISTS `{dataset_fqn}`
+        OPTIONS (location = '{self.location}');
+        
+        CREATE TABLE IF NOT EXISTS `{table_fqn}` (
+            id STRING NOT NULL,
+            section STRING,
+            -- UPPER(section), written at insert time for section lookups
+            section_upper STRING,
+            subsection STRING,
+            content STRING NOT NULL,
+            page_number INT64,
+            chunk_type STRING,
+            manual_type STRING,  -- owners, repair
+            embedding ARRAY<FLOAT64>,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+        -- Partition by ingest day and cluster on the filtered columns so
+        -- manual/chunk type and section filters prune blocks
+        PARTITION BY DATE(created_at)
+        CLUSTER BY manual_type, chunk_type, section_upper;
         
-        table_ref = self.client.dataset(dataset_id).table(table_id)
-        table = bigquery.Table(table_ref, schema=schema)
+        -- Tables created before section_upper existed get the column,
+        -- filled in for their rows, so section lookups still find them.
+        -- Checked first so the backfill only scans the table once.
+        SET add_section_upper = NOT EXISTS (
+            SELECT 1 FROM `{dataset_fqn}.INFORMATION_SCHEMA.COLUMNS`
+            WHERE table_name = '{table_id}' AND column_name = 'section_upper'
+        );
+        IF add_section_upper THEN
+            ALTER TABLE `{table_fqn}` ADD COLUMN IF NOT EXISTS section_upper STRING;
+            BEGIN
+                UPDATE `{table_fqn}` SET section_upper = UPPER(section)
+                WHERE section IS NOT NULL;
+            EXCEPTION WHEN ERROR THEN
+                -- Rows in the streaming buffer can't be updated yet and
+                -- keep a NULL section_upper until they are re-ingested
+                SELECT @@error.message AS backfill_error;
+            END;
+        END IF;
+        
+        -- OPTIONS only takes literals, so the index DDL is formatted
+        -- with num_lists = sqrt(row count), clamped as in _ivf_num_lists
+        EXECUTE IMMEDIATE FORMAT(
+            '''CREATE VECTOR INDEX IF NOT EXISTS manual_embedding_index
+            ON `{table_fqn}` (embedding)
+            OPTIONS (
+                index_type = 'IVF',
+                distance_type = 'COSINE',
+                ivf_options = '{{"num_lists": %d}}'
+            )''',
+            (
+                SELECT GREATEST({IVF_MIN_LISTS}, LEAST({IVF_MAX_LISTS},
+                    CAST(ROUND(SQRT(COUNT(*))) AS INT64)))
+                FROM `{table_fqn}`
+            )
+        );
+        """
         
         try:
-            table = self.client.create_table(table)
-            logger.info(f"Created table: {self.project_id}.{dataset_id}.{table_id}")
-        except Conflict:
-            logger.info(f"Table {table_id} already exists")
+            await self._run_query(script)
+            logger.info(f"Created/verified table and vector index: {table_fqn}")
         except Exception as e:
-            logger.error(f"Error creating table {table_id}: {e}")
+            logger.error(f"Error creating tables in {dataset_fqn}: {e}")
             raise
     
-    async def _create_vector_index(self, dataset_id: str, table_id: str) -> None:
-        """Create a vector index for efficient similarity search."""
+    async def rebuild_vector_index(
+        self,
+        dataset_id: str = "husqvarna_rag_dataset",
+        table_id: str = "manual_chunks",
+        row_count: Optional[int] = None
+    ) -> None:
+        """
+        Rebuild the vector index sized for the table's current rows.
+        
+        Run after large ingests; the index created at setup is sized for
+        the rows present then.
+        
+        Args:
+            dataset_id: Dataset ID
+            table_id: Table ID
+            row_count: Rows in the table; counted when not given
+        """
+        if row_count is None:
+            row_count = await self.get_chunk_count(dataset_id, table_id)
+        ivf_options = json.dumps({"num_lists": _ivf_num_lists(row_count)})
         
         query = f"""
         CREATE OR REPLACE VECTOR INDEX manual_embedding_index
-        ON `{self.project_id}.{dataset_id}.{table_id}` (embedding)
+        ON `{self._table_fqn(dataset_id, table_id)}` (embedding)
         OPTIONS (
             index_type = 'IVF',
-            distance_type = 'COSINE'
+            distance_type = 'COSINE',
+            ivf_options = '{ivf_options}'
         )
         """
         
         try:
-            job = self.client.query(query)
-            job.result()
+            await self._run_query(query)
             logger.info("Vector index created successfully")
         except Exception as e:
             logger.warning(f"Error creating vector index (may already exist): {e}")
@@ -117,7 +445,8 @@ class BigQueryClient:
         chunks: List[Dict[str, Any]], 
         embeddings: List[List[float]],
         dataset_id: str = "husqvarna_rag_dataset",
-        table_id: str = "manual_chunks"
+        table_id: str = "manual_chunks",
+        bulk_load: bool = False
     ) -> None:
         """
         Insert manual chunks with their embeddings into BigQuery.
@@ -127,32 +456,69 @@ class BigQueryClient:
             embeddings: List of embedding vectors
             dataset_id: Dataset ID
             table_id: Table ID
+            bulk_load: Write through one Parquet load job instead of
+                streaming; loads are free but take seconds to commit
         """
-        from datetime import datetime
+        if not chunks:
+            return
+        
+        # Every row of a batch shares one timestamp
+        now = datetime.utcnow()
+        embedding_matrix = np.asarray(embeddings, dtype=np.float32)
+        
+        if bulk_load:
+            table = _manual_chunks_arrow_table(chunks, embedding_matrix, now)
+            await asyncio.to_thread(self._load_arrow_table, table, dataset_id, table_id)
+            logger.info(f"Successfully loaded {table.num_rows} chunks into BigQuery")
+            return
         
         # Prepare data for BigQuery
         rows_to_insert = []
         
         for chunk, embedding in zip(chunks, embeddings):
+            section = chunk.get("section")
             row = {
                 "id": chunk.get("id"),
-                "section": chunk.get("section"),
+                "section": section,
+                "section_upper": section.upper() if section is not None else None,
                 "subsection": chunk.get("subsection"),
                 "content": chunk.get("content"),
                 "page_number": chunk.get("page_number"),
                 "chunk_type": chunk.get("chunk_type"),
                 "manual_type": chunk.get("manual_type", "owners"),
                 "embedding": embedding,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
+                "created_at": now,
+                "updated_at": now
             }
             rows_to_insert.append(row)
         
-        # Insert into BigQuery
-        table_ref = self.client.dataset(dataset_id).table(table_id)
-        table = self.client.get_table(table_ref)
+        # Large uploads go over the binary Storage Write API
+        if len(rows_to_insert) >= STORAGE_WRITE_MIN_ROWS:
+            await asyncio.to_thread(
+                self._append_rows_storage_write, rows_to_insert, dataset_id, table_id
+            )
+            logger.info(
+                f"Successfully wrote {len(rows_to_insert)} chunks "
+                f"via the Storage Write API"
+            )
+            return
+        
+        # TIMESTAMPs travel as ISO strings in JSON
+        timestamp = now.isoformat()
+        for row in rows_to_insert:
+            row["created_at"] = row["updated_at"] = timestamp
         
-        errors = self.client.insert_rows_json(table, rows_to_insert)
+        # Insert by table ID: JSON rows need no schema, so skip get_table.
+        # Row IDs let BigQuery deduplicate rows replayed by a retry
+        errors = await asyncio.to_thread(
+            self.client.insert_rows_json,
+            self._table_fqn(dataset_id, table_id),
+            rows_to_insert,
+            row_ids=[row["id"] for row in rows_to_insert],
+            skip_invalid_rows=False,
+            ignore_unknown_values=True,
+            retry=retry.Retry(predicate=retry.if_transient_error, deadline=120.0)
+        )
         
         if errors:
             logger.error(f"Errors inserting rows: {errors}")
@@ -160,13 +526,119 @@ class BigQueryClient:
         else:
             logger.info(f"Successfully inserted {len(rows_to_insert)} chunks into BigQuery")
     
+    def _load_arrow_table(
+        self,
+        table: pa.Table,
+        dataset_id: str,
+        table_id: str
+    ) -> None:
+        """
+        Append an Arrow table to BigQuery with one Parquet load job.
+        
+        Args:
+            table: Rows in manual_chunks schema
+            dataset_id: Dataset ID
+            table_id: Table ID
+        """
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        buffer.seek(0)
+        
+        parquet_options = bigquery.ParquetOptions()
+        # Load list columns as REPEATED rather than as list.element records
+        parquet_options.enable_list_inference = True
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            parquet_options=parquet_options
+        )
+        
+        self.client.load_table_from_file(
+            buffer, self._table_fqn(dataset_id, table_id), job_config=job_config
+        ).result()
+    
+    def _append_rows_storage_write(
+        self,
+        rows: List[Dict[str, Any]],
+        dataset_id: str,
+        table_id: str
+    ) -> None:
+        """
+        Write rows through the table's default Storage Write API stream.
+        
+        Rows are encoded as protobuf, so each embedding goes over the wire
+        as packed binary doubles instead of JSON text. Requests are
+        pipelined on one gRPC stream and awaited together. The default
+        stream gives at-least-once delivery.
+        
+        Args:
+            rows: Rows in manual_chunks schema
+            dataset_id: Dataset ID
+            table_id: Table ID
+        """
+        row_class = _manual_chunk_row_class()
+        
+        proto_descriptor = descriptor_pb2.DescriptorProto()
+        row_class.DESCRIPTOR.CopyToProto(proto_descriptor)
+        request_template = types.AppendRowsRequest(
+            write_stream=(
+                f"projects/{self.project_id}/datasets/{dataset_id}"
+                f"/tables/{table_id}/streams/_default"
+            ),
+            proto_rows=types.AppendRowsRequest.ProtoData(
+                writer_schema=types.ProtoSchema(proto_descriptor=proto_descriptor)
+            )
+        )
+        
+        write_client = _get_write_client()
+        append_rows_stream = writer.AppendRowsStream(write_client, request_template)
+        
+        def send(serialized_rows: List[bytes]):
+            request = types.AppendRowsRequest(
+                proto_rows=types.AppendRowsRequest.ProtoData(
+                    rows=types.ProtoRows(serialized_rows=serialized_rows)
+                )
+            )
+            return append_rows_stream.send(request)
+        
+        futures = []
+        try:
+            batch: List[bytes] = []
+            batch_bytes = 0
+            for row in rows:
+                message = row_class(
+                    embedding=row["embedding"],
+                    created_at=_timestamp_micros(row["created_at"]),
+                    updated_at=_timestamp_micros(row["updated_at"])
+                )
+                for field in ("id", "section", "section_upper", "subsection",
+                              "content", "page_number", "chunk_type", "manual_type"):
+                    if row[field] is not None:
+                        setattr(message, field, row[field])
+                serialized = message.SerializeToString()
+                
+                if batch and batch_bytes + len(serialized) > STORAGE_WRITE_MAX_REQUEST_BYTES:
+                    futures.append(send(batch))
+                    batch, batch_bytes = [], 0
+                batch.append(serialized)
+                batch_bytes += len(serialized)
+            
+            if batch:
+                futures.append(send(batch))
+            
+            for future in futures:
+                future.result()
+        finally:
+            append_rows_stream.close()
+    
     async def search_similar_chunks(
         self,
         query_embedding: List[float],
         max_results: int = 5,
         safety_level: Optional[int] = None,
         dataset_id: str = "husqvarna_rag_dataset",
-        table_id: str = "manual_chunks"
+        table_id: str = "manual_chunks",
+        fraction_lists_to_search: float = DEFAULT_FRACTION_LISTS_TO_SEARCH
     ) -> List[Dict[str, Any]]:
         """
         Search for similar chunks using vector similarity.
@@ -177,58 +649,179 @@ class BigQueryClient:
             safety_level: Optional safety level filter
             dataset_id: Dataset ID
             table_id: Table ID
+            fraction_lists_to_search: Share (0-1] of the vector index's
+                IVF lists to probe
             
         Returns:
             List of similar chunks with metadata
         """
-        # Convert embedding to string format for SQL
-        embedding_str = str(query_embedding)
+        query_parameters = [
+            bigquery.ArrayQueryParameter(
+                "query_embedding", "FLOAT64", list(query_embedding)
+            ),
+            bigquery.ScalarQueryParameter("max_results", "INT64", max_results)
+        ]
         
-        # Build the query
-        safety_filter = ""
-        if safety_level is not None:
-            safety_filter = f"AND chunk_type IN ('warning', 'safety')"
+        # Build the query; the embedding travels as a typed parameter so
+        # the SQL text stays small and identical across requests
+        base_table, base_parameters = self._vector_search_base_table(
+            dataset_id, table_id, safety_level
+        )
+        query_parameters.extend(base_parameters)
+        search_options = self._vector_search_options(fraction_lists_to_search)
         
         similarity_query = f"""
         SELECT 
-            id,
-            section,
-            subsection,
-            content,
-            page_number,
-            chunk_type,
-            manual_type,
-            VECTOR_SEARCH(
-                embedding,
-                {embedding_str},
-                top_k => {max_results}
-            ) as similarity_score
-        FROM `{self.project_id}.{dataset_id}.{table_id}`
-        WHERE embedding IS NOT NULL {safety_filter}
-        ORDER BY similarity_score DESC
-        LIMIT {max_results}
+            base.id,
+            base.section,
+            base.subsection,
+            base.content,
+            base.page_number,
+            base.chunk_type,
+            base.manual_type,
+            1 - distance AS similarity_score
+        FROM VECTOR_SEARCH(
+            {base_table},
+            'embedding',
+            (SELECT @query_embedding AS embedding),
+            top_k => @max_results,
+            distance_type => 'COSINE',
+            options => '{search_options}'
+        )
+        ORDER BY distance
         """
         
         # Execute the query
-        query_job = self.client.query(similarity_query)
-        results = query_job.result()
-        
-        # Convert to list of dictionaries
-        chunks = []
-        for row in results:
-            chunk = {
-                "id": row.id,
-                "section": row.section,
-                "subsection": row.subsection,
-                "content": row.content,
-                "page_number": row.page_number,
-                "chunk_type": row.chunk_type,
-                "manual_type": row.manual_type,
-                "similarity_score": row.similarity_score
-            }
-            chunks.append(chunk)
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        results = await self._run_query_arrow(similarity_query, job_config)
+        
+        # Column names already match the chunk dictionary keys
+        return results.to_pylist()
+    
+    async def search_similar_chunks_batch(
+        self,
+        query_embeddings: List[List[float]],
+        max_results: int = 5,
+        safety_level: Optional[int] = None,
+        dataset_id: str = "husqvarna_rag_dataset",
+        table_id: str = "manual_chunks",
+        fraction_lists_to_search: float = DEFAULT_FRACTION_LISTS_TO_SEARCH
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar chunks for several query embeddings at once.
+        
+        Queries are sent SEARCH_BATCH_SIZE at a time as one VECTOR_SEARCH
+        job each, so planning and slot acquisition are paid per batch
+        rather than per query. The jobs run concurrently.
+        
+        Args:
+            query_embeddings: Query embedding vectors
+            max_results: Maximum number of results per query
+            safety_level: Optional safety level filter
+            dataset_id: Dataset ID
+            table_id: Table ID
+            fraction_lists_to_search: Share (0-1] of the vector index's
+                IVF lists to probe
+            
+        Returns:
+            One list of similar chunks per query embedding, in input order
+        """
+        base_table, base_parameters = self._vector_search_base_table(
+            dataset_id, table_id, safety_level
+        )
+        search_options = self._vector_search_options(fraction_lists_to_search)
+        
+        similarity_query = f"""
+        SELECT 
+            query.qid,
+            base.id,
+            base.section,
+            base.subsection,
+            base.content,
+            base.page_number,
+            base.chunk_type,
+            base.manual_type,
+            1 - distance AS similarity_score
+        FROM VECTOR_SEARCH(
+            {base_table},
+            'embedding',
+            (SELECT qid, emb AS embedding FROM UNNEST(@queries)),
+            top_k => @max_results,
+            distance_type => 'COSINE',
+            options => '{search_options}'
+        )
+        ORDER BY query.qid, distance
+        """
         
-        return chunks
+        job_configs = []
+        for start in range(0, len(query_embeddings), SEARCH_BATCH_SIZE):
+            queries = [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("qid", "INT64", qid),
+                    bigquery.ArrayQueryParameter("emb", "FLOAT64", list(embedding))
+                )
+                for qid, embedding in enumerate(
+                    query_embeddings[start:start + SEARCH_BATCH_SIZE], start
+                )
+            ]
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ArrayQueryParameter("queries", "STRUCT", queries),
+                    bigquery.ScalarQueryParameter("max_results", "INT64", max_results),
+                    *base_parameters
+                ]
+            )
+            job_configs.append(job_config)
+        
+        # Run the batches as concurrent jobs, each from its own thread
+        batch_tables = await asyncio.gather(*(
+            self._run_query_arrow(similarity_query, job_config)
+            for job_config in job_configs
+        ))
+        
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for table in batch_tables:
+            for chunk in table.to_pylist():
+                results[chunk.pop("qid")].append(chunk)
+        
+        return results
+    
+    def _vector_search_base_table(
+        self,
+        dataset_id: str,
+        table_id: str,
+        safety_level: Optional[int]
+    ) -> Tuple[str, List[Any]]:
+        """Return the VECTOR_SEARCH base table SQL and its query parameters."""
+        table_fqn = self._table_fqn(dataset_id, table_id)
+        if safety_level is None:
+            return f"TABLE `{table_fqn}`", []
+        
+        base_table = f"""(
+            SELECT *
+            FROM `{table_fqn}`
+            WHERE chunk_type IN UNNEST(@safety_chunk_types)
+        )"""
+        return base_table, [
+            bigquery.ArrayQueryParameter(
+                "safety_chunk_types", "STRING", SAFETY_CHUNK_TYPES
+            )
+        ]
+    
+    @staticmethod
+    def _vector_search_options(fraction_lists_to_search: float) -> str:
+        """Return the VECTOR_SEARCH options JSON for the probe fraction."""
+        if not 0 < fraction_lists_to_search <= 1:
+            raise ValueError(
+                f"fraction_lists_to_search must be in (0, 1], "
+                f"got {fraction_lists_to_search}"
+            )
+        # Probe only a fraction of the IVF index lists instead of
+        # comparing against every vector; options must be a literal
+        return json.dumps(
+            {"fraction_lists_to_search": float(fraction_lists_to_search)}
+        )
     
     async def get_chunk_count(
         self, 
@@ -238,6 +831,9 @@ class BigQueryClient:
         """
         Get the total number of chunks in the table.
         
+        The count comes from table metadata, so no data is scanned; rows
+        still in the streaming buffer are not included.
+        
         Args:
             dataset_id: Dataset ID
             table_id: Table ID
@@ -246,14 +842,19 @@ class BigQueryClient:
             Total number of chunks
         """
         query = f"""
-        SELECT COUNT(*) as count
-        FROM `{self.project_id}.{dataset_id}.{table_id}`
+        SELECT COALESCE(SUM(row_count), 0) as count
+        FROM `{self._table_fqn(dataset_id, "__TABLES__")}`
+        WHERE table_id = @table_id
         """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("table_id", "STRING", table_id)
+            ]
+        )
         
         try:
-            query_job = self.client.query(query)
-            results = query_job.result()
-            return next(results).count
+            results = await self._run_query(query, job_config)
+            return results[0].count
         except Exception as e:
             logger.error(f"Error getting chunk count: {e}")
             return 0
@@ -273,46 +874,41 @@ class BigQueryClient:
         Returns:
             Analysis results
         """
+        # One pass yields per chunk type, per manual and overall totals;
+        # GROUPING() tells a rolled-up row from a NULL group key
         query = f"""
         SELECT 
             chunk_type,
             manual_type,
+            GROUPING(chunk_type) as all_types,
+            GROUPING(manual_type) as all_manuals,
             COUNT(*) as count,
-            AVG(LENGTH(content)) as avg_content_length
-        FROM `{self.project_id}.{dataset_id}.{table_id}`
-        GROUP BY chunk_type, manual_type
-        ORDER BY count DESC
+            SUM(LENGTH(content)) as total_length
+        FROM `{self._table_fqn(dataset_id, table_id)}`
+        GROUP BY GROUPING SETS ((chunk_type), (manual_type), ())
         """
         
         try:
-            results = self.client.query(query).result()
+            results = await self._run_query_arrow(query)
+            # Exact mean per group: total content length over chunk count
+            results = results.append_column(
+                "avg_length",
+                pc.divide(pc.cast(results["total_length"], pa.float64()), results["count"])
+            )
             
             analysis = {
                 "total_chunks": 0,
                 "by_type": {},
                 "by_manual": {}
             }
-            
-            for row in results:
-                analysis["total_chunks"] += row.count
-                
-                # By chunk type
-                if row.chunk_type not in analysis["by_type"]:
-                    analysis["by_type"][row.chunk_type] = {
-                        "count": 0,
-                        "avg_length": 0
-                    }
-                analysis["by_type"][row.chunk_type]["count"] += row.count
-                analysis["by_type"][row.chunk_type]["avg_length"] = row.avg_content_length
-                
-                # By manual type
-                if row.manual_type not in analysis["by_manual"]:
-                    analysis["by_manual"][row.manual_type] = {
-                        "count": 0,
-                        "avg_length": 0
-                    }
-                analysis["by_manual"][row.manual_type]["count"] += row.count
-                analysis["by_manual"][row.manual_type]["avg_length"] = row.avg_content_length
+            for row in results.to_pylist():
+                totals = {"count": row["count"], "avg_length": row["avg_length"]}
+                if row["all_types"] and row["all_manuals"]:
+                    analysis["total_chunks"] = row["count"]
+                elif row["all_manuals"]:
+                    analysis["by_type"][row["chunk_type"]] = totals
+                else:
+                    analysis["by_manual"][row["manual_type"]] = totals
             
             return analysis
             
@@ -327,10 +923,10 @@ class BigQueryClient:
         table_id: str = "manual_chunks"
     ) -> List[Dict[str, Any]]:
         """
-        Search for content in a specific manual section.
+        Search for content in manual sections whose name contains a fragment.
         
         Args:
-            section_name: Section name to search for
+            section_name: Part of the section name (case-insensitive)
             dataset_id: Dataset ID
             table_id: Table ID
             
@@ -345,27 +941,19 @@ class BigQueryClient:
             page_number,
             chunk_type,
             manual_type
-        FROM `{self.project_id}.{dataset_id}.{table_id}`
-        WHERE UPPER(section) LIKE UPPER('%{section_name}%')
+        FROM `{self._table_fqn(dataset_id, table_id)}`
+        WHERE STRPOS(section_upper, @fragment) > 0
         ORDER BY page_number
         """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("fragment", "STRING", section_name.upper())
+            ]
+        )
         
         try:
-            results = self.client.query(query).result()
-            
-            chunks = []
-            for row in results:
-                chunk = {
-                    "id": row.id,
-                    "subsection": row.subsection,
-                    "content": row.content,
-                    "page_number": row.page_number,
-                    "chunk_type": row.chunk_type,
-                    "manual_type": row.manual_type
-                }
-                chunks.append(chunk)
-            
-            return chunks
+            results = await self._run_query_arrow(query, job_config)
+            return results.to_pylist()
             
         except Exception as e:
             logger.error(f"Error searching by section: {e}")
@@ -379,18 +967,17 @@ class BigQueryClient:
         """
         Clear all data from the table.
         
+        TRUNCATE is a metadata operation, so unlike a DELETE it neither
+        scans nor bills for the table's rows.
+        
         Args:
             dataset_id: Dataset ID
             table_id: Table ID
         """
-        query = f"""
-        DELETE FROM `{self.project_id}.{dataset_id}.{table_id}`
-        WHERE 1=1
-        """
+        query = f"TRUNCATE TABLE `{self._table_fqn(dataset_id, table_id)}`"
         
         try:
-            job = self.client.query(query)
-            job.result()
+            await self._run_query(query)
             logger.info(f"Cleared table {table_id}")
         except Exception as e:
             logger.error(f"Error clearing table: {e}")
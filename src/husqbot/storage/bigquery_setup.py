@@ -54,6 +54,22 @@ def setup_bigquery_resources(
         chunks_table = client.create_table(chunks_table)
         logger.info("Created table document_chunks")
     
+    # Create pdf_hashes table used to skip unchanged PDFs on re-ingest
+    hashes_table_ref = dataset_ref.table("pdf_hashes")
+    try:
+        client.get_table(hashes_table_ref)
+        logger.info("Table pdf_hashes already exists")
+    except NotFound:
+        hashes_schema = [
+            bigquery.SchemaField("path", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("sha256", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("processed_at", "TIMESTAMP", mode="REQUIRED"),
+        ]
+        
+        hashes_table = bigquery.Table(hashes_table_ref, schema=hashes_schema)
+        hashes_table = client.create_table(hashes_table)
+        logger.info("Created table pdf_hashes")
+    
     # Create image_metadata table
     images_table_ref = dataset_ref.table("image_metadata")
     try:
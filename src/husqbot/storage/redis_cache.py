@@ -0,0 +1,99 @@
+"""
+Shared Redis cache for vector search results.
+"""
+
+import logging
+from typing import List, Dict, Any, Optional
+
+try:
+    import msgpack
+    import redis.asyncio as redis
+except ImportError:
+    msgpack = None
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Keys scanned and unlinked per round trip when clearing the cache
+CLEAR_BATCH_SIZE = 500
+
+
+class RedisCache:
+    """Search results cache shared by every worker through Redis."""
+    
+    def __init__(
+        self,
+        url: str,
+        ttl_seconds: int = 3600,
+        key_prefix: str = "husqbot:vector_search:"
+    ):
+        """
+        Initialize the Redis cache.
+        
+        Args:
+            url: Redis URL, e.g. redis://localhost:6379/0
+            ttl_seconds: Expiry of each cached result
+            key_prefix: Prefix namespacing the cache keys
+        """
+        if redis is None:
+            raise ImportError(
+                "redis and msgpack are required for the shared cache. "
+                "Install them with: pip install -r requirements-cache.txt"
+            )
+        
+        self.client = redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        
+        logger.info("Initialized Redis search cache")
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Fetch cached results in one round trip.
+        
+        Args:
+            keys: Cache keys
+        
+        Returns:
+            Cached chunk list per key, or None where nothing is cached
+        """
+        values = await self.client.mget([self.key_prefix + key for key in keys])
+        return [
+            msgpack.unpackb(value) if value is not None else None
+            for value in values
+        ]
+    
+    async def set_many(self, items: Dict[str, List[Dict[str, Any]]]) -> None:
+        """
+        Store results with the cache TTL in one round trip.
+        
+        Args:
+            items: Chunk lists by cache key
+        """
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, chunks in items.items():
+                pipe.set(self.key_prefix + key, msgpack.packb(chunks), ex=self.ttl_seconds)
+            await pipe.execute()
+    
+    async def clear(self) -> int:
+        """
+        Delete every cached result under the key prefix.
+        
+        Keys are found with SCAN rather than KEYS so a large cache
+        doesn't block Redis for other clients.
+        
+        Returns:
+            Number of keys deleted
+        """
+        deleted = 0
+        keys = []
+        async for key in self.client.scan_iter(
+            match=self.key_prefix + "*", count=CLEAR_BATCH_SIZE
+        ):
+            keys.append(key)
+            if len(keys) >= CLEAR_BATCH_SIZE:
+                deleted += await self.client.unlink(*keys)
+                keys = []
+        if keys:
+            deleted += await self.client.unlink(*keys)
+        return deleted
@@ -2,25 +2,50 @@
 Vector search functionality for Husqvarna RAG Support System.
 """
 
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
-from .bigquery_client import BigQueryClient
+import numpy as np
+from .bigquery_client import BigQueryClient, DEFAULT_FRACTION_LISTS_TO_SEARCH
+from .redis_cache import RedisCache
 
 logger = logging.getLogger(__name__)
 
+# Searches kept in the LRU cache before the oldest is evicted
+MAX_CACHE_ENTRIES = 1024
+
+
+def _copy_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy cached chunks so callers can't modify the cached rows."""
+    return [dict(chunk) for chunk in chunks]
+
 
 class VectorSearch:
     """Handles vector similarity search operations."""
     
-    def __init__(self, bigquery_client: BigQueryClient):
+    def __init__(
+        self,
+        bigquery_client: BigQueryClient,
+        redis_url: Optional[str] = None,
+        redis_ttl_seconds: int = 3600
+    ):
         """
         Initialize vector search.
         
         Args:
             bigquery_client: BigQuery client instance
+            redis_url: Redis URL for a cache shared across workers;
+                only the in-process cache is used when not set
+            redis_ttl_seconds: Expiry of results in the shared cache
         """
         self.bigquery_client = bigquery_client
-        self.cache = {}  # Simple in-memory cache
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # LRU
+        self.shared_cache = (
+            RedisCache(redis_url, ttl_seconds=redis_ttl_seconds) if redis_url else None
+        )
+        self.cache_hits = 0
+        self.cache_misses = 0
         
         logger.info("Initialized vector search")
     
@@ -29,6 +54,7 @@ class VectorSearch:
         query_embedding: List[float],
         max_results: int = 5,
         safety_level: Optional[int] = None,
+        fraction_lists_to_search: float = DEFAULT_FRACTION_LISTS_TO_SEARCH,
         **kwargs
     ) -> List[Dict[str, Any]]:
         """
@@ -38,30 +64,151 @@ class VectorSearch:
             query_embedding: Query embedding vector
             max_results: Maximum number of results
             safety_level: Optional safety level filter
+            fraction_lists_to_search: Share of IVF index lists to probe;
+                higher improves recall at the cost of latency
             **kwargs: Additional search parameters
             
         Returns:
             List of similar chunks with metadata
         """
+        cache_key = self._create_cache_key(
+            query_embedding, max_results, safety_level, fraction_lists_to_search
+        )
+        cached = await self._get_cached([cache_key])
+        if cache_key in cached:
+            self.cache_hits += 1
+            return _copy_chunks(cached[cache_key])
+        self.cache_misses += 1
+        
         try:
             chunks = await self.bigquery_client.search_similar_chunks(
                 query_embedding=query_embedding,
                 max_results=max_results,
-                safety_level=safety_level
+                safety_level=safety_level,
+                fraction_lists_to_search=fraction_lists_to_search
             )
-            
-            # Add cache entry
-            cache_key = self._create_cache_key(query_embedding, max_results, safety_level)
-            self.cache[cache_key] = {
-                "chunks": chunks,
-                "timestamp": self._get_timestamp()
-            }
-            
-            return chunks
-            
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
             raise
+        
+        await self._put_cached({cache_key: chunks})
+        return _copy_chunks(chunks)
+    
+    async def search_similar_chunks_batch(
+        self,
+        query_embeddings: List[List[float]],
+        max_results: int = 5,
+        safety_level: Optional[int] = None,
+        fraction_lists_to_search: float = DEFAULT_FRACTION_LISTS_TO_SEARCH
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar chunks for several query embeddings.
+        
+        Cached queries are answered locally; the rest share batched
+        BigQuery jobs instead of one job each.
+        
+        Args:
+            query_embeddings: Query embedding vectors
+            max_results: Maximum number of results per query
+            safety_level: Optional safety level filter
+            fraction_lists_to_search: Share of IVF index lists to probe
+            
+        Returns:
+            One list of similar chunks per query embedding, in input order
+        """
+        cache_keys = [
+            self._create_cache_key(
+                query_embedding, max_results, safety_level, fraction_lists_to_search
+            )
+            for query_embedding in query_embeddings
+        ]
+        cached = await self._get_cached(list(dict.fromkeys(cache_keys)))
+        
+        results: List[Optional[List[Dict[str, Any]]]] = []
+        missing: Dict[str, List[int]] = {}
+        for position, cache_key in enumerate(cache_keys):
+            if cache_key in cached:
+                self.cache_hits += 1
+                results.append(_copy_chunks(cached[cache_key]))
+            else:
+                self.cache_misses += 1
+                missing.setdefault(cache_key, []).append(position)
+                results.append(None)
+        
+        if missing:
+            try:
+                searched = await self.bigquery_client.search_similar_chunks_batch(
+                    query_embeddings=[
+                        query_embeddings[positions[0]] for positions in missing.values()
+                    ],
+                    max_results=max_results,
+                    safety_level=safety_level,
+                    fraction_lists_to_search=fraction_lists_to_search
+                )
+            except Exception as e:
+                logger.error(f"Error in batch vector search: {e}")
+                raise
+            
+            for positions, chunks in zip(missing.values(), searched):
+                for position in positions:
+                    results[position] = _copy_chunks(chunks)
+            await self._put_cached(dict(zip(missing, searched)))
+        
+        return results
+    
+    async def _get_cached(self, cache_keys: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Look keys up in the local LRU, then in the shared cache.
+        
+        Args:
+            cache_keys: Distinct cache keys
+            
+        Returns:
+            Cached chunk lists by key, for the keys that were found; these
+            are the cached objects themselves, copied before returning
+        """
+        found = {}
+        for cache_key in cache_keys:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                self.cache.move_to_end(cache_key)
+                found[cache_key] = entry["chunks"]
+        
+        remaining = [cache_key for cache_key in cache_keys if cache_key not in found]
+        if remaining and self.shared_cache is not None:
+            try:
+                shared = await self.shared_cache.get_many(remaining)
+            except Exception as e:
+                # Redis being unreachable only costs the shared hits
+                logger.warning(f"Shared search cache unavailable: {e}")
+            else:
+                for cache_key, chunks in zip(remaining, shared):
+                    if chunks is not None:
+                        found[cache_key] = chunks
+                        self._put_local(cache_key, chunks)
+        
+        return found
+    
+    async def _put_cached(self, items: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Store search results locally and in the shared cache."""
+        for cache_key, chunks in items.items():
+            self._put_local(cache_key, chunks)
+        
+        if self.shared_cache is not None:
+            try:
+                await self.shared_cache.set_many(items)
+            except Exception as e:
+                logger.warning(f"Could not write to shared search cache: {e}")
+    
+    def _put_local(self, cache_key: str, chunks: List[Dict[str, Any]]) -> None:
+        """Add an entry to the local LRU, evicting the least recently used."""
+        self.cache[cache_key] = {
+            "chunks": chunks,
+            "timestamp": self._get_timestamp()
+        }
+        self.cache.move_to_end(cache_key)
+        if len(self.cache) > MAX_CACHE_ENTRIES:
+            self.cache.popitem(last=False)
     
     async def get_cache_stats(self) -> Dict[str, Any]:
         """
@@ -70,40 +217,51 @@ class VectorSearch:
         Returns:
             Cache statistics dictionary
         """
-        if not self.cache:
-            return {
-                "hit_rate": 0.0,
-                "total_entries": 0,
-                "last_updated": None
-            }
-        
-        total_entries = len(self.cache)
-        # Simple cache hit rate estimation
-        hit_rate = min(0.75, total_entries / 100)  # Placeholder
+        lookups = self.cache_hits + self.cache_misses
         
         return {
-            "hit_rate": hit_rate,
-            "total_entries": total_entries,
-            "last_updated": self._get_timestamp()
+            "backend": "redis" if self.shared_cache is not None else "local",
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "total_entries": len(self.cache),
+            "last_updated": self._get_timestamp() if self.cache else None
         }
     
     def _create_cache_key(
         self, 
         embedding: List[float], 
         max_results: int, 
-        safety_level: Optional[int]
+        safety_level: Optional[int],
+        fraction_lists_to_search: float = DEFAULT_FRACTION_LISTS_TO_SEARCH
     ) -> str:
         """Create a cache key for the search parameters."""
-        # Use a simple hash of the first few embedding values
-        embedding_hash = hash(tuple(embedding[:10]))
-        return f"{embedding_hash}_{max_results}_{safety_level}"
+        # Hash the whole vector: a prefix collides, and hash() is
+        # randomized per process
+        digest = hashlib.blake2b(
+            np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16
+        )
+        digest.update(
+            f"{max_results}_{safety_level}_{fraction_lists_to_search}".encode()
+        )
+        return digest.hexdigest()
     
     def _get_timestamp(self) -> str:
         """Get current timestamp string."""
         from datetime import datetime
         return datetime.utcnow().isoformat()
     
-    def clear_cache(self) -> None:
-        """Clear the search cache."""
+    async def clear_cache(self) -> None:
+        """Clear the local and shared search caches."""
         self.cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        if self.shared_cache is not None:
+            try:
+                deleted = await self.shared_cache.clear()
+            except Exception as e:
+                logger.warning(f"Could not clear shared search cache: {e}")
+            else:
+                logger.info(f"Deleted {deleted} shared search cache entries")
         logger.info("Vector search cache cleared") 
\ No newline at end of file
@@ -2,34 +2,59 @@
 Pytest configuration and fixtures for Husqvarna RAG Support System tests.
 """
 
-import pytest
 import asyncio
-from unittest.mock import Mock, AsyncMock
+import sys
+import time
+
+import pytest
+from unittest.mock import DEFAULT, Mock, AsyncMock, create_autospec, patch
 from typing import Dict, Any
 
-from src.husqbot.core.rag_system import HusqvarnaRAGSystem, QueryResult
+from src.husqbot.storage.bigquery_client import BigQueryClient
+from src.husqbot.core.rag_system import (
+    MAX_BATCH_CONCURRENCY,
+    HusqvarnaRAGSystem,
+    QueryResult
+)
 
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
-@pytest.fixture
 def mock_bigquery_client():
     """Mock BigQuery client for testing."""
-    client = Mock()
-    client.create_dataset_if_not_exists = AsyncMock()
-    client.create_tables_if_not_exists = AsyncMock()
-    client.get_chunk_count = AsyncMock(return_value=1000)
-    client.insert_chunks_with_embeddings = AsyncMock()
+    client = create_autospec(BigQueryClient, instance=True, spec_set=True)
+    client.get_chunk_count.return_value = 1000
     return client
 
 
 @pytest.fixture
+def bigquery_client():
+    """Real BigQueryClient over mocked Google Cloud clients."""
+    with patch.multiple(
+        'src.husqbot.storage.bigquery_client',
+        get_bigquery_client=DEFAULT,
+        _get_read_client=DEFAULT
+    ):
+        return BigQueryClient("test-project", "us-central1")
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """In-memory Redis behind every RedisCache, as a synchronous client.
+    
+    Skips the test when the cache extras and fakeredis aren't installed.
+    """
+    pytest.importorskip("msgpack")
+    fakeredis = pytest.importorskip("fakeredis")
+    from src.husqbot.storage import redis_cache
+    
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis_cache.redis, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server)
+    )
+    return fakeredis.FakeRedis(server=server)
+
+
+@pytest.fixture(scope="session")
 def mock_vector_search():
     """Mock vector search for testing."""
     search = Mock()
@@ -41,7 +66,7 @@ def mock_vector_search():
     return search
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_document_processor():
     """Mock document processor for testing."""
     processor = Mock()
@@ -49,7 +74,7 @@ def mock_document_processor():
     return processor
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_embedding_model():
     """Mock embedding model for testing."""
     model = Mock()
@@ -58,7 +83,7 @@ def mock_embedding_model():
     return model
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_generation_model():
     """Mock generation model for testing."""
     model = Mock()
@@ -66,7 +91,7 @@ def mock_generation_model():
     return model
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_intent_detector():
     """Mock intent detector for testing."""
     detector = Mock()
@@ -74,7 +99,7 @@ def mock_intent_detector():
     return detector
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_safety_enhancer():
     """Mock safety enhancer for testing."""
     enhancer = Mock()
@@ -83,7 +108,7 @@ def mock_safety_enhancer():
     return enhancer
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_response_generator():
     """Mock response generator for testing."""
     generator = Mock()
@@ -91,38 +116,61 @@ def mock_response_generator():
     return generator
 
 
-@pytest.fixture
-def sample_query_result():
+# Bump when editing the sample data below, so stale cache entries are ignored
+SAMPLE_CACHE_VERSION = 2
+
+
+def _cached_sample(pytestconfig, name: str, build):
+    """Return JSON sample data from the pytest cache, building it on a miss.
+    
+    Every xdist worker reads the same .pytest_cache entry, so all of them
+    test against identical data.
+    """
+    cache = getattr(pytestconfig, "cache", None)
+    if cache is None:  # run with -p no:cacheprovider
+        return build()
+    
+    key = f"husqbot/{name}/v{SAMPLE_CACHE_VERSION}"
+    data = cache.get(key, None)
+    if data is None:
+        data = build()
+        cache.set(key, data)
+    return data
+
+
+@pytest.fixture(scope="session")
+def sample_query_result(pytestconfig):
     """Sample query result for testing."""
-    return QueryResult(
-        answer="Test answer",
-        sources=[{"content": "Test source", "manual_type": "owners"}],
-        confidence=0.85,
-        safety_level=1,
-        processing_time=1.5,
-        metadata={"intent": "maintenance", "user_skill_level": "intermediate"}
-    )
+    fields = _cached_sample(pytestconfig, "sample_query_result", lambda: {
+        "answer": "Test answer",
+        "sources": [{"content": "Test source", "manual_type": "owners"}],
+        "confidence": 0.85,
+        "safety_level": 1,
+        "processing_time": 1.5,
+        "metadata": {"intent": "maintenance", "user_skill_level": "intermediate"}
+    })
+    return QueryResult(**fields)
 
 
-@pytest.fixture
-def sample_chunks():
-    """Sample document chunks for testing."""
-    return [
-        Mock(
-            content="Test chunk 1",
-            manual_type="owners",
-            section="Maintenance",
-            similarity_score=0.9,
-            to_dict=lambda: {"content": "Test chunk 1", "manual_type": "owners"}
-        ),
-        Mock(
-            content="Test chunk 2",
-            manual_type="repair",
-            section="Engine",
-            similarity_score=0.8,
-            to_dict=lambda: {"content": "Test chunk 2", "manual_type": "repair"}
-        )
-    ]
+@pytest.fixture(scope="session")
+def sample_chunks(pytestconfig):
+    """Sample document chunks, as returned by the similarity search."""
+    return _cached_sample(pytestconfig, "sample_chunks", lambda: [
+        {
+            "content": "Test chunk 1",
+            "source": "husky_om_701_part012.pdf",
+            "page_number": 12,
+            "similarity": 0.9,
+            "safety_level": 1
+        },
+        {
+            "content": "Test chunk 2",
+            "source": "husky_rm_701_part034.pdf",
+            "page_number": 34,
+            "similarity": 0.8,
+            "safety_level": 2
+        }
+    ])
 
 
 @pytest.fixture
@@ -136,7 +184,7 @@ def test_config():
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_queries():
     """Sample queries for testing."""
     return [
@@ -146,30 +194,87 @@ def sample_queries():
     ]
 
 
-@pytest.fixture
-def mock_rag_system(
-    mock_bigquery_client,
-    mock_vector_search,
-    mock_document_processor,
-    mock_embedding_model,
-    mock_generation_model,
-    mock_intent_detector,
-    mock_safety_enhancer,
-    mock_response_generator
-):
-    """Mock RAG system for testing."""
-    system = Mock(spec=HusqvarnaRAGSystem)
+def _async_stub(return_value=None, delay: float = 0.0):
+    """Coroutine function that records its calls and returns return_value.
+    
+    Far cheaper than an AsyncMock where no spec or call matching is needed.
+    ``calls`` holds each call's (args, kwargs) and ``windows`` the
+    (start, end) perf_counter times of each completed call.
+    """
+    async def stub(*args, **kwargs):
+        stub.calls.append((args, kwargs))
+        start = time.perf_counter()
+        if delay:
+            await asyncio.sleep(delay)
+        stub.windows.append((start, time.perf_counter()))
+        return return_value
+    
+    stub.calls = []
+    stub.windows = []
+    return stub
+
+
+@pytest.fixture(scope="session")
+def async_stub():
+    """Factory of lightweight async stubs for patching coroutine methods."""
+    return _async_stub
+
+
+class _RAGSystemSpec(HusqvarnaRAGSystem):
+    """HusqvarnaRAGSystem plus the instance attributes its __init__ sets.
+    
+    spec_set only accepts names visible on the spec, so they are declared
+    here; test_init fails if this falls behind HusqvarnaRAGSystem.__init__.
+    """
+    
+    project_id = location = dataset_id = table_id = table_ref = None
+    max_concurrency = use_fallback = None
+    bq_client = bigquery_client = embedding_generator = text_model = None
+    _response_cache = _pending_queries = _embedding_batch = _embedding_flush = None
+
+
+@pytest.fixture(scope="session")
+def mock_rag_system(mock_bigquery_client, mock_embedding_model, mock_generation_model):
+    """Mock RAG system built once per session; use ``rag_system`` in tests."""
+    system = create_autospec(_RAGSystemSpec, instance=True, spec_set=True)
     system.project_id = "test-project"
     system.location = "us-central1"
+    system.dataset_id = "husqvarna_rag_dataset"
+    system.table_id = "document_chunks"
+    system.table_ref = "test-project.husqvarna_rag_dataset.document_chunks"
+    system.use_fallback = False
+    system.max_concurrency = MAX_BATCH_CONCURRENCY
+    system.bq_client = Mock()
     system.bigquery_client = mock_bigquery_client
-    system.vector_search = mock_vector_search
-    system.document_processor = mock_document_processor
-    system.embedding_model = mock_embedding_model
-    system.generation_model = mock_generation_model
-    system.intent_detector = mock_intent_detector
-    system.safety_enhancer = mock_safety_enhancer
-    system.response_generator = mock_response_generator
-    system.query_system = AsyncMock()
-    system.batch_query = AsyncMock()
-    system.get_system_stats = AsyncMock()
-    return system 
\ No newline at end of file
+    system.embedding_generator = mock_embedding_model
+    system.text_model = mock_generation_model
+    return system
+
+
+@pytest.fixture
+def rag_pipeline():
+    """Real RAG system, with its own caches, over mocked Google Cloud clients."""
+    with patch.multiple(
+        'src.husqbot.core.rag_system',
+        bigquery=DEFAULT,
+        BigQueryClient=DEFAULT,
+        vertexai=DEFAULT,
+        EmbeddingGenerator=DEFAULT
+    ), patch.dict(sys.modules, {'vertexai.generative_models': Mock()}):
+        system = HusqvarnaRAGSystem("test-project", "us-central1")
+    
+    system.embedding_generator.generate_embeddings.side_effect = (
+        lambda texts: [[0.1] * 768 for _ in texts]
+    )
+    return system
+
+
+@pytest.fixture
+def rag_system(mock_rag_system):
+    """Session RAG system mock with call records and test overrides cleared.
+    
+    Tests stub the session mock through side_effect only, so this reset
+    undoes them while the return values configured at build time survive.
+    """
+    mock_rag_system.reset_mock(side_effect=True)
+    yield mock_rag_system
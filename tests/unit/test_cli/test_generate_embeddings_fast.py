@@ -0,0 +1,43 @@
+"""
+Unit tests for the embedding checkpoint file.
+"""
+
+import orjson
+
+from src.husqbot.cli.generate_embeddings_fast import append_checkpoint, read_checkpoint
+
+
+class TestCheckpoint:
+    """Test cases for read_checkpoint and append_checkpoint."""
+    
+    def test_round_trip(self, tmp_path):
+        """Test appended batches are read back in order."""
+        checkpoint_file = str(tmp_path / "checkpoint.ndjson")
+        
+        append_checkpoint(checkpoint_file, ["a", "b"])
+        append_checkpoint(checkpoint_file, ["c"])
+        
+        assert list(read_checkpoint(checkpoint_file)) == ["a", "b", "c"]
+    
+    def test_truncated_last_line(self, tmp_path):
+        """Test a batch cut short mid-write is skipped and later ones kept."""
+        checkpoint_file = tmp_path / "checkpoint.ndjson"
+        append_checkpoint(str(checkpoint_file), ["a", "b"])
+        with open(checkpoint_file, "ab") as f:
+            f.write(b'{"chunk_ids": ["c", "d"')
+        
+        assert list(read_checkpoint(str(checkpoint_file))) == ["a", "b"]
+        
+        append_checkpoint(str(checkpoint_file), ["e"])
+        
+        assert list(read_checkpoint(str(checkpoint_file))) == ["a", "b", "e"]
+    
+    def test_legacy_format(self, tmp_path):
+        """Test a checkpoint in the old single-object format is still read."""
+        checkpoint_file = tmp_path / "checkpoint.json"
+        checkpoint_file.write_bytes(orjson.dumps({
+            "processed_chunks": ["a", "b"],
+            "last_processed": 1700000000.0
+        }))
+        
+        assert list(read_checkpoint(str(checkpoint_file))) == ["a", "b"]
@@ -2,155 +2,357 @@
 Unit tests for the HusqvarnaRAGSystem class.
 """
 
+import asyncio
+import copy
+import dataclasses
+import pickle
+import sys
+import time
+from types import MappingProxyType
+from typing import Final
+
 import pytest
-from unittest.mock import Mock, AsyncMock, patch
-from src.husqbot.core.rag_system import HusqvarnaRAGSystem, QueryResult
+from unittest.mock import DEFAULT, Mock, patch
+
+from src.husqbot.core import rag_system as rag_system_module
+from src.husqbot.core.rag_system import (
+    HusqvarnaRAGSystem,
+    QueryResult,
+    _calculate_confidence
+)
+
+# query_system's defaults, merged under each parametrized call
+_QUERY_DEFAULTS: Final = MappingProxyType({
+    "user_skill_level": "intermediate",
+    "max_chunks": 5,
+    "temperature": 0.1
+})
+
+# Stats row returned by the mocked BigQuery client and what it reports as
+_STATS_ROW: Final = Mock(
+    total_chunks=1000,
+    chunks_with_embeddings=1000,
+    unique_sources=24,
+    avg_safety_level=1.5,
+    min_safety_level=0,
+    max_safety_level=3
+)
+_EXPECTED_STATS: Final = MappingProxyType({
+    "total_chunks": 1000,
+    "chunks_with_embeddings": 1000,
+    "embedding_coverage": 100.0,
+    "unique_sources": 24,
+    "avg_safety_level": 1.5,
+    "safety_level_range": [0, 3],
+    "text_generation_mode": "gemini",
+    "system_status": "healthy"
+})
+
+# Chunk rows the mocked similarity search returns
+_SEARCH_ROWS: Final = (
+    MappingProxyType({
+        "content": "Check the oil level with the engine warm.",
+        "source": "husky_om_701_part012.pdf",
+        "page_number": 12,
+        "similarity": 0.9,
+        "safety_level": 1
+    }),
+)
+
+_QUERY_RESULT_KWARGS: Final = MappingProxyType({
+    "answer": "Test answer",
+    "sources": [{"content": "Test source", "source": "husky_om_701_part012.pdf"}],
+    "confidence": 0.85,
+    "safety_level": 1,
+    "processing_time": 1.5,
+    "metadata": {"intent": "maintenance"}
+})
 
 
 class TestHusqvarnaRAGSystem:
     """Test cases for HusqvarnaRAGSystem."""
     
-    @pytest.fixture
-    def rag_system(self, mock_rag_system):
-        """Create a RAG system instance for testing."""
-        return mock_rag_system
-    
-    @pytest.mark.asyncio
-    async def test_init(self):
+    def test_init(self, rag_system):
         """Test RAG system initialization."""
-        with patch('src.husqbot.core.rag_system.BigQueryClient'), \
-             patch('src.husqbot.core.rag_system.VectorSearch'), \
-             patch('src.husqbot.core.rag_system.DocumentProcessor'), \
-             patch('src.husqbot.core.rag_system.EmbeddingModel'), \
-             patch('src.husqbot.core.rag_system.GenerationModel'), \
-             patch('src.husqbot.core.rag_system.IntentDetector'), \
-             patch('src.husqbot.core.rag_system.SafetyEnhancer'), \
-             patch('src.husqbot.core.rag_system.ResponseGenerator'):
+        # One patcher for every client the constructor builds; the
+        # generation model is imported lazily, so it is swapped in sys.modules
+        with patch.multiple(
+            'src.husqbot.core.rag_system',
+            bigquery=DEFAULT,
+            BigQueryClient=DEFAULT,
+            vertexai=DEFAULT,
+            EmbeddingGenerator=DEFAULT
+        ), patch.dict(sys.modules, {'vertexai.generative_models': Mock()}):
             
             system = HusqvarnaRAGSystem("test-project", "us-central1")
             
             assert system.project_id == "test-project"
             assert system.location == "us-central1"
+            # The spec_set session mock must allow every attribute __init__ sets
+            assert [name for name in vars(system) if not hasattr(rag_system, name)] == []
     
-    @pytest.mark.asyncio
-    async def test_setup_complete_system(self, rag_system):
-        """Test complete system setup."""
-        # Mock the _import_manuals method
-        rag_system._import_manuals = AsyncMock()
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_setup_complete_system(self, rag_system, async_stub, monkeypatch):
+        """Test setup creates the tables it uses before importing the manuals."""
+        manuals = async_stub(delay=0.01)
+        resources = []
+        monkeypatch.setattr(
+            rag_system_module,
+            "setup_bigquery_resources",
+            lambda *args: resources.append((args, time.perf_counter()))
+        )
+        monkeypatch.setattr(rag_system, "_import_manuals", manuals)
+        monkeypatch.setattr(rag_system, "_response_cache", {"stale": None})
         
-        await rag_system.setup_complete_system()
+        await HusqvarnaRAGSystem.setup_complete_system(rag_system)
         
-        rag_system.bigquery_client.create_dataset_if_not_exists.assert_called_once()
-        rag_system.bigquery_client.create_tables_if_not_exists.assert_called_once()
-        rag_system._import_manuals.assert_called_once()
+        assert [args for args, _ in resources] == [
+            ("test-project", "husqvarna_rag_dataset", "us-central1")
+        ]
+        assert manuals.calls == [((), {})]
+        # The dataset, document_chunks and pdf_hashes, then the import
+        assert resources[0][1] <= manuals.windows[0][0]
+        # manual_chunks and its vector index aren't used by the RAG system
+        rag_system.bigquery_client.create_tables_if_not_exists.assert_not_called()
+        # Answers cached before the import are dropped
+        assert rag_system._response_cache == {}
     
-    @pytest.mark.asyncio
-    async def test_query_system_success(self, rag_system, sample_query_result):
-        """Test successful query processing."""
-        rag_system.query_system.return_value = sample_query_result
+    @pytest.mark.asyncio(loop_scope="module")
+    @pytest.mark.parametrize("kwargs", [
+        {"query": "How do I check the oil?", "user_skill_level": "intermediate"},
+        {"query": "Test query", "user_skill_level": "expert", "max_chunks": 10, "temperature": 0.5}
+    ])
+    async def test_query_system(self, rag_pipeline, kwargs, monkeypatch):
+        """Test query processing with default and custom parameters."""
+        chunks = list(_SEARCH_ROWS)
+        search = Mock(return_value=chunks)
+        generate = Mock(return_value="Test answer")
+        monkeypatch.setattr(rag_pipeline, "search_similar_chunks", search)
+        monkeypatch.setattr(rag_pipeline, "generate_response", generate)
         
-        result = await rag_system.query_system(
-            query="How do I check the oil?",
-            user_skill_level="intermediate"
-        )
+        result = await rag_pipeline.query_system(**kwargs)
         
-        assert result == sample_query_result
-        rag_system.query_system.assert_called_once_with(
-            query="How do I check the oil?",
-            user_skill_level="intermediate",
-            max_chunks=5
+        call = {**_QUERY_DEFAULTS, **kwargs}
+        generate_embeddings = rag_pipeline.embedding_generator.generate_embeddings
+        generate_embeddings.assert_called_once_with([call["query"]])
+        search.assert_called_once_with(
+            call["query"], call["max_chunks"], query_embedding=[0.1] * 768
         )
+        generate.assert_called_once_with(call["query"], chunks, temperature=call["temperature"])
+        assert result.answer == "Test answer"
+        assert result.confidence == 0.9
+        assert result.safety_level == 1
+        assert result.metadata["user_skill_level"] == call["user_skill_level"]
     
-    @pytest.mark.asyncio
-    async def test_query_system_with_custom_params(self, rag_system, sample_query_result):
-        """Test query system with custom parameters."""
-        rag_system.query_system.return_value = sample_query_result
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_query_system_batches_concurrent_embeddings(self, rag_pipeline, monkeypatch):
+        """Test queries arriving together share one embedding call."""
+        monkeypatch.setattr(rag_pipeline, "search_similar_chunks", Mock(return_value=[]))
+        queries = [f"Question {i}" for i in range(8)]
         
-        result = await rag_system.query_system(
-            query="Test query",
-            user_skill_level="expert",
-            max_chunks=10,
-            temperature=0.5
+        results = await asyncio.gather(*(rag_pipeline.query_system(query) for query in queries))
+        
+        generate_embeddings = rag_pipeline.embedding_generator.generate_embeddings
+        generate_embeddings.assert_called_once_with(queries)
+        assert [result.metadata["chunks_found"] for result in results] == [0] * len(queries)
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_query_system_caches_identical_queries(self, rag_pipeline, monkeypatch):
+        """Test identical queries, concurrent or repeated, are answered once."""
+        generate = Mock(return_value="Test answer")
+        monkeypatch.setattr(
+            rag_pipeline, "search_similar_chunks", Mock(return_value=list(_SEARCH_ROWS))
         )
+        monkeypatch.setattr(rag_pipeline, "generate_response", generate)
+        query = "How do I check the oil?"
+        
+        concurrent = await asyncio.gather(*(rag_pipeline.query_system(query) for _ in range(8)))
+        repeated = await rag_pipeline.query_system(query)
         
-        rag_system.query_system.assert_called_once_with(
-            query="Test query",
-            user_skill_level="expert",
-            max_chunks=10,
-            temperature=0.5
+        rag_pipeline.embedding_generator.generate_embeddings.assert_called_once_with([query])
+        generate.assert_called_once()
+        # Each caller gets its own copy, timed from its own call
+        assert all(result is not repeated for result in concurrent)
+        assert all(
+            dataclasses.replace(result, processing_time=repeated.processing_time) == repeated
+            for result in concurrent
         )
+        # Without rebuilding the cached sources for every copy
+        assert all(result.sources is repeated.sources for result in concurrent)
+        assert all(result.metadata is not repeated.metadata for result in concurrent)
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    @pytest.mark.parametrize("chunks, fallback_mode", [
+        ([], False),
+        (list(_SEARCH_ROWS), True)
+    ])
+    async def test_query_system_skips_caching_degraded_answers(
+        self, rag_pipeline, chunks, fallback_mode, monkeypatch
+    ):
+        """Test answers without sources or from fallback mode are not cached."""
+        monkeypatch.setattr(rag_pipeline, "search_similar_chunks", Mock(return_value=chunks))
+        monkeypatch.setattr(rag_pipeline, "generate_response", Mock(return_value="Test answer"))
+        monkeypatch.setattr(rag_pipeline, "use_fallback", fallback_mode)
+        
+        await rag_pipeline.query_system("How do I check the oil?")
+        await rag_pipeline.query_system("How do I check the oil?")
+        
+        assert rag_pipeline.search_similar_chunks.call_count == 2
     
-    @pytest.mark.asyncio
-    async def test_batch_query_success(self, rag_system, sample_queries, sample_query_result):
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_query_system_expires_cached_answers(self, rag_pipeline, monkeypatch):
+        """Test cached answers are recomputed once their TTL has passed."""
+        search = Mock(return_value=list(_SEARCH_ROWS))
+        monkeypatch.setattr(rag_pipeline, "search_similar_chunks", search)
+        monkeypatch.setattr(rag_pipeline, "generate_response", Mock(return_value="Test answer"))
+        monkeypatch.setattr(rag_system_module, "RESPONSE_CACHE_TTL_SECONDS", 0.0)
+        
+        await rag_pipeline.query_system("How do I check the oil?")
+        await rag_pipeline.query_system("How do I check the oil?")
+        
+        assert search.call_count == 2
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_query_success(
+        self, rag_pipeline, sample_queries, sample_query_result, monkeypatch
+    ):
         """Test successful batch query processing."""
-        rag_system.batch_query.return_value = [sample_query_result] * len(sample_queries)
+        answered = []
+        
+        async def answer(query, user_skill_level):
+            answered.append((query, user_skill_level))
+            return sample_query_result
+        
+        monkeypatch.setattr(rag_pipeline, "query_system", answer)
         
-        results = await rag_system.batch_query(sample_queries, "intermediate")
+        results = await rag_pipeline.batch_query(sample_queries, "expert")
         
-        assert len(results) == len(sample_queries)
-        rag_system.batch_query.assert_called_once_with(sample_queries, "intermediate")
+        assert results == [sample_query_result] * len(sample_queries)
+        assert answered == [(query, "expert") for query in sample_queries]
     
-    @pytest.mark.asyncio
-    async def test_batch_query_with_exceptions(self, rag_system, sample_queries):
-        """Test batch query with some exceptions."""
-        results = [sample_query_result, Exception("Test error"), sample_query_result]
-        rag_system.batch_query.return_value = results
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_query_with_exceptions(
+        self, rag_pipeline, sample_queries, sample_query_result, monkeypatch
+    ):
+        """Test a failing query is returned in its place without failing the rest."""
+        error = Exception("Test error")
         
-        batch_results = await rag_system.batch_query(sample_queries, "intermediate")
+        async def answer(query, user_skill_level):
+            if query == sample_queries[1]:
+                raise error
+            return sample_query_result
         
-        assert len(batch_results) == len(sample_queries)
-        assert isinstance(batch_results[0], QueryResult)
-        assert isinstance(batch_results[1], Exception)
-        assert isinstance(batch_results[2], QueryResult)
+        monkeypatch.setattr(rag_pipeline, "query_system", answer)
+        
+        batch_results = await rag_pipeline.batch_query(sample_queries, "intermediate")
+        
+        assert batch_results == [sample_query_result, error, sample_query_result]
     
-    @pytest.mark.asyncio
-    async def test_get_system_stats_success(self, rag_system):
-        """Test successful system stats retrieval."""
-        expected_stats = {
-            "total_chunks": 1000,
-            "cache_hit_rate": 0.75,
-            "system_status": "healthy",
-            "last_updated": "2024-01-01T00:00:00Z"
-        }
-        rag_system.get_system_stats.return_value = expected_stats
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_query_gathers_once(
+        self, rag_system, sample_queries, sample_query_result, monkeypatch
+    ):
+        """Test batch queries run under one gather that keeps exceptions."""
+        async def answer(query, user_skill_level):
+            if query == sample_queries[1]:
+                raise Exception("Test error")
+            return sample_query_result
+        
+        monkeypatch.setattr(rag_system, "query_system", answer)
         
-        stats = await rag_system.get_system_stats()
+        with patch(
+            'src.husqbot.core.rag_system.asyncio.gather', wraps=asyncio.gather
+        ) as gather:
+            results = await HusqvarnaRAGSystem.batch_query(
+                rag_system, sample_queries, "intermediate"
+            )
         
-        assert stats == expected_stats
-        rag_system.get_system_stats.assert_called_once()
+        gather.assert_called_once()
+        assert gather.call_args.kwargs == {"return_exceptions": True}
+        assert len(gather.call_args.args) == len(sample_queries)
+        assert results[0] == sample_query_result
+        assert isinstance(results[1], Exception)
+        assert results[2] == sample_query_result
     
-    @pytest.mark.asyncio
-    async def test_get_system_stats_error(self, rag_system):
-        """Test system stats retrieval with error."""
-        rag_system.get_system_stats.side_effect = Exception("Database error")
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_query_bounded_concurrency(
+        self, rag_system, sample_query_result, monkeypatch
+    ):
+        """Test batch_query keeps at most max_concurrency queries in flight."""
+        max_concurrency = 2
+        in_flight = 0
+        peak = 0
         
-        stats = await rag_system.get_system_stats()
+        async def answer(query, user_skill_level):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return sample_query_result
         
-        assert stats["system_status"] == "error"
-        assert "Database error" in stats["error"]
+        monkeypatch.setattr(rag_system, "query_system", answer)
+        queries = [f"Question {i}" for i in range(10)]
+        
+        with patch.object(rag_system, "max_concurrency", max_concurrency):
+            results = await HusqvarnaRAGSystem.batch_query(
+                rag_system, queries, "intermediate"
+            )
+        
+        assert results == [sample_query_result] * len(queries)
+        assert peak == max_concurrency
     
-    def test_build_context(self, rag_system, sample_chunks):
-        """Test context building from chunks."""
-        intent = "maintenance"
-        user_skill_level = "intermediate"
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_query_streams_results(
+        self, rag_system, sample_queries, sample_query_result, monkeypatch
+    ):
+        """Test streamed batch results arrive in completion order."""
+        delays = dict(zip(sample_queries, (0.06, 0.0, 0.03)))
+        
+        async def answer(query, user_skill_level):
+            await asyncio.sleep(delays[query])
+            if delays[query] == 0.03:
+                raise Exception("Test error")
+            return sample_query_result
         
-        context = rag_system._build_context(sample_chunks, intent, user_skill_level)
+        monkeypatch.setattr(rag_system, "query_system", answer)
         
-        assert "Source 1 (owners, Maintenance)" in context
-        assert "Source 2 (repair, Engine)" in context
-        assert "Query Intent: maintenance" in context
-        assert "User Skill Level: intermediate" in context
+        results = [
+            item async for item in
+            HusqvarnaRAGSystem.batch_query_stream(rag_system, sample_queries, "intermediate")
+        ]
+        
+        assert [index for index, _ in results] == [1, 2, 0]
+        assert results[0][1] == sample_query_result
+        assert isinstance(results[1][1], Exception)
+        assert results[2][1] == sample_query_result
     
-    def test_calculate_confidence(self, rag_system, sample_chunks):
+    @pytest.mark.parametrize("side_effect, expected_status", [
+        (lambda query: [_STATS_ROW], "healthy"),
+        (Exception("Database error"), "error")
+    ])
+    def test_get_system_stats(self, rag_system, side_effect, expected_status):
+        """Test system stats retrieval and its error path."""
+        rag_system.bq_client.query.side_effect = side_effect
+        
+        stats = HusqvarnaRAGSystem.get_system_stats(rag_system)
+        
+        assert stats["system_status"] == expected_status
+        if expected_status == "healthy":
+            assert stats == _EXPECTED_STATS
+        else:
+            assert "Database error" in stats["error"]
+    
+    def test_calculate_confidence(self, sample_chunks):
         """Test confidence calculation."""
-        confidence = rag_system._calculate_confidence(sample_chunks)
+        confidence = _calculate_confidence(sample_chunks)
         
         # Expected: (0.9 + 0.8) / 2 = 0.85
         assert confidence == 0.85
     
-    def test_calculate_confidence_empty_chunks(self, rag_system):
+    def test_calculate_confidence_empty_chunks(self):
         """Test confidence calculation with empty chunks."""
-        confidence = rag_system._calculate_confidence([])
+        confidence = _calculate_confidence([])
         
         assert confidence == 0.0
 
@@ -160,22 +362,56 @@ class TestQueryResult:
     
     def test_query_result_creation(self):
         """Test QueryResult creation."""
-        result = QueryResult(
-            answer="Test answer",
-            sources=[{"content": "Test source"}],
-            confidence=0.85,
-            safety_level=1,
-            processing_time=1.5,
-            metadata={"intent": "maintenance"}
-        )
+        result = QueryResult(**_QUERY_RESULT_KWARGS)
         
         assert result.answer == "Test answer"
         assert len(result.sources) == 1
+        assert isinstance(result.sources, tuple)
         assert result.confidence == 0.85
         assert result.safety_level == 1
         assert result.processing_time == 1.5
         assert result.metadata["intent"] == "maintenance"
     
+    def test_query_result_is_frozen_without_dict(self):
+        """Test QueryResult is immutable and slotted."""
+        result = QueryResult(**_QUERY_RESULT_KWARGS)
+        
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            result.answer = "Changed"
+        assert not hasattr(result, "__dict__")
+        assert result == QueryResult(**_QUERY_RESULT_KWARGS)
+    
+    @pytest.mark.parametrize("clone", [
+        copy.copy,
+        copy.deepcopy,
+        lambda result: pickle.loads(pickle.dumps(result)),
+    ], ids=["copy", "deepcopy", "pickle"])
+    def test_query_result_round_trips(self, clone):
+        """Test QueryResult survives copying and pickling."""
+        result = QueryResult(**_QUERY_RESULT_KWARGS)
+        
+        cloned = clone(result)
+        
+        assert cloned == result
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            cloned.answer = "Changed"
+    
+    def test_query_result_is_not_hashable(self):
+        """Test QueryResult refuses hashing since its dict fields can change."""
+        with pytest.raises(TypeError, match="unhashable"):
+            hash(QueryResult(**_QUERY_RESULT_KWARGS))
+    
+    def test_query_result_interns_sources(self):
+        """Test source labels from separate rows share one string object."""
+        canonical = sys.intern("husky_om_701_part012.pdf")
+        fresh = "".join(["husky_om_701", "_part012.pdf"])
+        assert fresh is not canonical
+        
+        result = QueryResult(**{**_QUERY_RESULT_KWARGS, "sources": [{"source": fresh}]})
+        
+        assert result.sources == ({"source": canonical},)
+        assert result.sources[0]["source"] is canonical
+    
     def test_query_result_defaults(self):
         """Test QueryResult with minimal parameters."""
         result = QueryResult(
@@ -188,5 +424,5 @@ class TestQueryResult:
         )
         
         assert result.answer == "Test"
-        assert result.sources == []
+        assert result.sources == ()
         assert result.confidence == 0.0 
\ No newline at end of file
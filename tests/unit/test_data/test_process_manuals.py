@@ -0,0 +1,348 @@
+"""
+Unit tests for manual ingestion into BigQuery.
+"""
+
+import hashlib
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock
+
+import numpy as np
+import pytest
+from google.api_core.exceptions import BadRequest
+
+from src.husqbot.data import process_manuals
+from src.husqbot.data.chunk import Chunk
+
+_PDF_NAME = "husky_om_701_part001.pdf"
+_PDF_BYTES = b"%PDF-1.4"
+_PDF_HASH = hashlib.sha256(_PDF_BYTES).hexdigest()
+
+
+def _chunks(count: int, content_length: int = 100):
+    """Chunks of one PDF with fixed-size content and no embedding."""
+    return [
+        Chunk(
+            chunk_id=f"{_PDF_NAME}_{i}",
+            content="x" * content_length,
+            source=_PDF_NAME,
+            page_number=1,
+            safety_level=0,
+            created_at="2024-01-01T00:00:00",
+            embedding=[]
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    """Run process_single_manual on one PDF over a mocked BigQuery client.
+    
+    Returns a function taking the PDF's chunks and extra keyword
+    arguments; it returns the mocked client, also set as its ``client``
+    next to the mocked ``processor``.
+    """
+    client = Mock()
+    client.insert_rows_json.return_value = []
+    processor = Mock()
+    monkeypatch.setattr(process_manuals, "get_bigquery_client", Mock(return_value=client))
+    monkeypatch.setattr(process_manuals, "DocumentProcessor", Mock(return_value=processor))
+    
+    def run(chunks, **kwargs):
+        processor.process_pdf_bytes.return_value = chunks
+        kwargs.setdefault("ingest_state", {})
+        process_manuals.process_single_manual(
+            "test-project",
+            input_file=_PDF_NAME,
+            pdf_bytes=_PDF_BYTES,
+            **kwargs
+        )
+        return client
+    
+    run.client = client
+    run.processor = processor
+    return run
+
+
+class TestInsertBatching:
+    """Test cases for sizing streaming insert requests (bulk_load=False)."""
+    
+    def test_estimate_row_bytes(self):
+        """Test the row size counts content plus JSON-encoded floats."""
+        chunk = _chunks(1)[0]
+        chunk.embedding = [0.1] * 768
+        
+        size = process_manuals._estimate_row_bytes(chunk)
+        
+        assert size == 100 + 768 * process_manuals.JSON_BYTES_PER_FLOAT
+    
+    @pytest.mark.parametrize("limit, value, expected_sizes", [
+        ("INSERT_MAX_ROWS", 2, [2, 2, 2, 1]),
+        ("INSERT_MAX_BYTES", 250, [3, 3, 1])
+    ])
+    def test_requests_split_at_limit(self, ingest, limit, value, expected_sizes, monkeypatch):
+        """Test a request is sent as soon as either limit is reached."""
+        monkeypatch.setattr(process_manuals, limit, value)
+        chunks = _chunks(7)
+        
+        client = ingest(chunks, batch_size=5, bulk_load=False)
+        
+        requests = [call.args[1] for call in client.insert_rows_json.call_args_list]
+        assert [len(rows) for rows in requests] == expected_sizes
+        # Every chunk is sent once, in order, keyed by its chunk_id
+        assert [row["chunk_id"] for rows in requests for row in rows] == [
+            chunk.chunk_id for chunk in chunks
+        ]
+        assert [
+            row_id
+            for call in client.insert_rows_json.call_args_list
+            for row_id in call.kwargs["row_ids"]
+        ] == [chunk.chunk_id for chunk in chunks]
+    
+    def test_requests_independent_of_embedding_batch(self, ingest):
+        """Test small embedding batches are combined into one request."""
+        client = ingest(_chunks(7), batch_size=2, bulk_load=False)
+        
+        assert client.insert_rows_json.call_count == 1
+        assert len(client.insert_rows_json.call_args.args[1]) == 7
+    
+    def test_insert_errors_abort_before_storing_hash(self, ingest):
+        """Test a failed insert raises and leaves no hash behind."""
+        ingest.client.insert_rows_json.return_value = [{"index": 0, "errors": ["invalid"]}]
+        
+        with pytest.raises(RuntimeError, match="Error inserting rows"):
+            ingest(_chunks(3), bulk_load=False)
+        
+        queries = [call.args[0] for call in ingest.client.query.call_args_list]
+        assert not any("MERGE" in query for query in queries)
+    
+    def test_failed_embedding_loads_nothing(self, ingest, monkeypatch):
+        """Test rows buffered before a mid-PDF failure are not loaded."""
+        generator = _embedding_generator(monkeypatch)
+        generator.generate_embeddings.side_effect = [
+            np.zeros((2, 3), dtype=np.float32),
+            RuntimeError("Vertex AI unavailable")
+        ]
+        monkeypatch.setattr(process_manuals, "INSERT_MAX_ROWS", 2)
+        
+        with pytest.raises(RuntimeError, match="Vertex AI unavailable"):
+            ingest(_chunks(5), batch_size=2, store_embeddings=True)
+        
+        ingest.client.load_table_from_file.assert_not_called()
+        assert _queries(ingest.client) == []
+        # The generator it created is still shut down
+        generator.__exit__.assert_called_once()
+
+
+def _embedding_generator(monkeypatch):
+    """Patch in a mocked EmbeddingGenerator and return the instance."""
+    generator = MagicMock()
+    generator.__enter__.return_value = generator
+    generator.generate_embeddings.side_effect = (
+        lambda texts: np.zeros((len(texts), 3), dtype=np.float32)
+    )
+    monkeypatch.setattr(
+        process_manuals, "EmbeddingGenerator", Mock(return_value=generator)
+    )
+    return generator
+
+
+def _queries(client):
+    """SQL of every query the client ran, in order."""
+    return [call.args[0] for call in client.query.call_args_list]
+
+
+class TestReingest:
+    """Test cases for skipping and replacing previously ingested PDFs."""
+    
+    def test_unchanged_pdf_is_skipped(self, ingest):
+        """Test a PDF whose stored hash matches is not processed again."""
+        client = ingest(_chunks(3), ingest_state={_PDF_NAME: _PDF_HASH})
+        
+        ingest.processor.process_pdf_bytes.assert_not_called()
+        client.load_table_from_file.assert_not_called()
+        assert _queries(client) == []
+    
+    def test_force_reprocesses_unchanged_pdf(self, ingest):
+        """Test force replaces the rows of an unchanged PDF."""
+        client = ingest(_chunks(3), ingest_state={_PDF_NAME: _PDF_HASH}, force=True)
+        
+        assert ["DELETE" in query for query in _queries(client)] == [True, False]
+        client.load_table_from_file.assert_called_once()
+    
+    @pytest.mark.parametrize("stored_hash", ["0" * 64, None])
+    def test_changed_or_interrupted_pdf_is_replaced(self, ingest, stored_hash):
+        """Test old rows are deleted before re-inserting, then the hash stored."""
+        client = ingest(_chunks(3), ingest_state={_PDF_NAME: stored_hash})
+        
+        delete, merge = client.query.call_args_list
+        assert "DELETE" in delete.args[0]
+        assert delete.kwargs["job_config"].query_parameters[0].value == _PDF_NAME
+        client.load_table_from_file.assert_called_once()
+        assert "MERGE" in merge.args[0]
+        assert [
+            parameter.value for parameter in merge.kwargs["job_config"].query_parameters
+        ] == [_PDF_NAME, _PDF_HASH]
+    
+    def test_new_pdf_is_inserted_without_delete(self, ingest):
+        """Test a PDF without rows is inserted and its hash stored."""
+        client = ingest(_chunks(3))
+        
+        assert ["MERGE" in query for query in _queries(client)] == [True]
+        client.load_table_from_file.assert_called_once()
+    
+    def test_rows_in_streaming_buffer_are_left_alone(self, ingest):
+        """Test a PDF whose old rows can't be deleted yet is skipped."""
+        ingest.client.query.side_effect = BadRequest(
+            "UPDATE or DELETE statement over table would affect rows "
+            "in the streaming buffer, which is not supported"
+        )
+        
+        client = ingest(_chunks(3), ingest_state={_PDF_NAME: None})
+        
+        # No duplicate rows and no hash, so a later run replaces them
+        assert len(_queries(client)) == 1
+        ingest.processor.process_pdf_bytes.assert_not_called()
+        client.load_table_from_file.assert_not_called()
+    
+    def test_other_delete_errors_raise(self, ingest):
+        """Test DELETE failures other than the streaming buffer abort."""
+        ingest.client.query.side_effect = BadRequest("Syntax error")
+        
+        with pytest.raises(BadRequest, match="Syntax error"):
+            ingest(_chunks(3), ingest_state={_PDF_NAME: None})
+        
+        ingest.client.load_table_from_file.assert_not_called()
+
+
+class TestBulkLoad:
+    """Test cases for writing a PDF with one load job (the default)."""
+    
+    def test_rows_are_loaded_in_one_job(self, ingest, monkeypatch):
+        """Test every batch is buffered as NDJSON and appended by one job."""
+        monkeypatch.setattr(process_manuals, "INSERT_MAX_ROWS", 2)
+        chunks = _chunks(5)
+        
+        client = ingest(chunks, batch_size=2)
+        
+        client.insert_rows_json.assert_not_called()
+        client.load_table_from_file.assert_called_once()
+        (buffer, table_ref), kwargs = client.load_table_from_file.call_args
+        assert table_ref == "test-project.husqvarna_rag_dataset.document_chunks"
+        rows = [json.loads(line) for line in buffer.getvalue().splitlines()]
+        assert [row["chunk_id"] for row in rows] == [chunk.chunk_id for chunk in chunks]
+        assert list(rows[0]) == list(process_manuals.ROW_KEYS)
+        job_config = kwargs["job_config"]
+        assert job_config.source_format == "NEWLINE_DELIMITED_JSON"
+        assert job_config.write_disposition == "WRITE_APPEND"
+        client.load_table_from_file.return_value.result.assert_called_once()
+        assert ["MERGE" in query for query in _queries(client)] == [True]
+    
+    def test_load_errors_abort_before_storing_hash(self, ingest):
+        """Test a failed load job raises and leaves no hash behind."""
+        ingest.client.load_table_from_file.return_value.result.side_effect = BadRequest(
+            "Provided Schema does not match"
+        )
+        
+        with pytest.raises(BadRequest, match="Schema does not match"):
+            ingest(_chunks(3))
+        
+        assert _queries(ingest.client) == []
+
+
+class TestIngestState:
+    """Test cases for looking up previously ingested PDFs."""
+    
+    @pytest.mark.parametrize("path", [None, _PDF_NAME])
+    def test_get_ingest_state(self, path):
+        """Test one script creates the hash table and joins rows to hashes."""
+        client = Mock()
+        client.query.return_value.result.return_value = [
+            SimpleNamespace(path=_PDF_NAME, sha256=_PDF_HASH),
+            SimpleNamespace(path="husky_om_701_part002.pdf", sha256=None)
+        ]
+        
+        state = process_manuals._get_ingest_state(
+            client, "p.d.document_chunks", "p.d.pdf_hashes", path
+        )
+        
+        assert state == {_PDF_NAME: _PDF_HASH, "husky_om_701_part002.pdf": None}
+        client.query.assert_called_once()
+        (script,), kwargs = client.query.call_args
+        # Datasets created before hashes were tracked get the table first
+        assert script.index("CREATE TABLE IF NOT EXISTS `p.d.pdf_hashes`") < script.index(
+            "FULL OUTER JOIN hashes USING (path)"
+        )
+        assert "FROM `p.d.document_chunks`" in script
+        parameters = kwargs["job_config"].query_parameters
+        if path is None:
+            assert "@path" not in script
+            assert parameters == []
+        else:
+            assert "WHERE source = @path" in script and "WHERE path = @path" in script
+            assert [(parameter.name, parameter.value) for parameter in parameters] == [
+                ("path", _PDF_NAME)
+            ]
+
+
+class TestDirectoryIngest:
+    """Test cases for ingesting every split PDF of a manual."""
+    
+    def test_directory_is_ingested_with_one_state_lookup(
+        self, ingest, tmp_path, monkeypatch
+    ):
+        """Test each PDF is read ahead and processed unless it is unchanged."""
+        split_dir = tmp_path / "data" / "raw" / "owners_manual" / "split"
+        split_dir.mkdir(parents=True)
+        names = [f"husky_om_701_part00{i}.pdf" for i in range(1, 5)]
+        for name in names:
+            (split_dir / name).write_bytes(name.encode())
+        (split_dir / "notes.txt").write_text("not a manual")
+        # data_dir is resolved four levels above the module
+        monkeypatch.setattr(
+            process_manuals, "__file__",
+            str(tmp_path / "src" / "husqbot" / "data" / "process_manuals.py")
+        )
+        # The second PDF is unchanged since the last run
+        unchanged_hash = hashlib.sha256(names[1].encode()).hexdigest()
+        ingest.client.query.return_value.result.return_value = [
+            SimpleNamespace(path=names[1], sha256=unchanged_hash)
+        ]
+        ingest.processor.process_pdf_bytes.side_effect = lambda pdf_bytes, name: _chunks(2)
+        
+        process_manuals.process_single_manual("test-project")
+        
+        processed = [call.args for call in ingest.processor.process_pdf_bytes.call_args_list]
+        assert processed == [
+            (name.encode(), name) for name in (names[0], names[2], names[3])
+        ]
+        queries = _queries(ingest.client)
+        assert "FULL OUTER JOIN" in queries[0]
+        assert not any("FULL OUTER JOIN" in query for query in queries[1:])
+        assert ["MERGE" in query for query in queries[1:]] == [True] * 3
+        assert ingest.client.load_table_from_file.call_count == 3
+    
+    def test_directory_shares_one_embedding_generator(
+        self, ingest, tmp_path, monkeypatch
+    ):
+        """Test every PDF is embedded by one generator, closed at the end."""
+        split_dir = tmp_path / "data" / "raw" / "owners_manual" / "split"
+        split_dir.mkdir(parents=True)
+        for i in range(3):
+            (split_dir / f"husky_om_701_part00{i}.pdf").write_bytes(bytes([i]))
+        monkeypatch.setattr(
+            process_manuals, "__file__",
+            str(tmp_path / "src" / "husqbot" / "data" / "process_manuals.py")
+        )
+        ingest.client.query.return_value.result.return_value = []
+        ingest.processor.process_pdf_bytes.side_effect = lambda pdf_bytes, name: _chunks(2)
+        generator = _embedding_generator(monkeypatch)
+        
+        process_manuals.process_single_manual("test-project", store_embeddings=True)
+        
+        process_manuals.EmbeddingGenerator.assert_called_once_with(
+            "test-project", "us-central1"
+        )
+        assert generator.generate_embeddings.call_count == 3
+        generator.__exit__.assert_called_once()
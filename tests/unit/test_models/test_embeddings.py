@@ -0,0 +1,98 @@
+"""
+Unit tests for the EmbeddingGenerator class.
+"""
+
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from src.husqbot.data.chunk import Chunk
+from src.husqbot.models import embeddings as embeddings_module
+from src.husqbot.models.embeddings import EMBEDDING_DIMENSION, EmbeddingGenerator
+
+
+def _embed(texts):
+    """Fake get_embeddings: each text maps to a vector of its length."""
+    return [Mock(values=[float(len(text))] * 3) for text in texts]
+
+
+@pytest.fixture
+def embedding_generator(monkeypatch):
+    """EmbeddingGenerator over a mocked Vertex AI model."""
+    model = Mock()
+    model.get_embeddings.side_effect = _embed
+    monkeypatch.setattr(embeddings_module, "_get_model", Mock(return_value=model))
+    return EmbeddingGenerator("test-project", "us-central1", max_workers=4)
+
+
+def _chunk(chunk_id: str, content: str) -> Chunk:
+    """Chunk of one PDF with the given text and no embedding."""
+    return Chunk(
+        chunk_id=chunk_id,
+        content=content,
+        source="husky_om_701_part001.pdf",
+        page_number=1,
+        safety_level=0,
+        created_at="2024-01-01T00:00:00",
+        embedding=[]
+    )
+
+
+class TestEmbeddingGenerator:
+    """Test cases for EmbeddingGenerator."""
+    
+    def test_generate_embeddings_keeps_input_order(self, embedding_generator):
+        """Test concurrent requests come back in input order."""
+        texts = ["a" * length for length in range(1, 21)]
+        
+        result = embedding_generator.generate_embeddings(texts)
+        
+        assert result.dtype == np.float32
+        assert result[:, 0].tolist() == list(range(1, 21))
+    
+    def test_generate_embeddings_failed_request(self, embedding_generator):
+        """Test a failed request yields a zero vector placeholder."""
+        embedding_generator.model.get_embeddings.side_effect = ValueError("bad input")
+        
+        result = embedding_generator.generate_embeddings(["text"])
+        
+        assert result.shape == (1, EMBEDDING_DIMENSION)
+        assert not result.any()
+    
+    def test_generate_embeddings_empty(self, embedding_generator):
+        """Test no texts give an empty matrix of the model's dimension."""
+        result = embedding_generator.generate_embeddings([])
+        
+        assert result.shape == (0, EMBEDDING_DIMENSION)
+    
+    def test_generate_embeddings_for_chunks_dedups_texts(self, embedding_generator):
+        """Test repeated chunk texts are embedded once and share a vector."""
+        chunks = [
+            _chunk("1", "WARNING"),
+            _chunk("2", "Check the oil."),
+            _chunk("3", "WARNING"),
+            _chunk("4", "WARNING")
+        ]
+        
+        result = embedding_generator.generate_embeddings_for_chunks(chunks)
+        
+        assert result is chunks
+        embedded = [
+            call.args[0][0] for call in embedding_generator.model.get_embeddings.call_args_list
+        ]
+        assert sorted(embedded) == ["Check the oil.", "WARNING"]
+        assert [chunk.embedding[0] for chunk in chunks] == [7.0, 14.0, 7.0, 7.0]
+        assert all(
+            type(chunk.embedding) is list and type(chunk.embedding[0]) is float
+            for chunk in chunks
+        )
+    
+    def test_close_shuts_down_request_threads(self, embedding_generator):
+        """Test closing, directly or as a context manager, stops the pool."""
+        with embedding_generator as generator:
+            generator.generate_embeddings(["Check the oil."])
+        
+        assert generator is embedding_generator
+        with pytest.raises(RuntimeError, match="shutdown"):
+            embedding_generator.generate_embeddings(["Check the oil."])
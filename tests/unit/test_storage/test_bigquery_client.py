@@ -0,0 +1,182 @@
+"""
+Unit tests for the BigQueryClient class.
+"""
+
+import re
+from datetime import datetime
+from unittest.mock import Mock
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
+
+from src.husqbot.storage import bigquery_client as bigquery_client_module
+from src.husqbot.storage.bigquery_client import (
+    BIGQUERY_SCOPES,
+    HTTP_POOL_SIZE,
+    IVF_MAX_LISTS,
+    IVF_MIN_LISTS,
+    _MANUAL_CHUNKS_ARROW_SCHEMA,
+    _ivf_num_lists,
+    _manual_chunks_arrow_table,
+    get_bigquery_client
+)
+
+# One column definition of the CREATE TABLE statement
+_DDL_COLUMN = re.compile(r"^\s*(\w+) ([A-Z0-9<>]+)( NOT NULL)?,?(\s*--.*)?$")
+
+
+class TestBigQueryClient:
+    """Test cases for BigQueryClient."""
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_arrow_schema_matches_ddl(self, bigquery_client, async_stub, monkeypatch):
+        """Test Parquet loads declare the same columns and modes as the table."""
+        run_query = async_stub()
+        monkeypatch.setattr(bigquery_client, "_run_query", run_query)
+        
+        await bigquery_client.create_tables_if_not_exists()
+        
+        (script,), _ = run_query.calls[0]
+        create_table = script[script.index("CREATE TABLE"):]
+        create_table = create_table[:create_table.index("\n        )")]
+        columns = [
+            (match.group(1), match.group(3) is not None)
+            for match in map(_DDL_COLUMN.match, create_table.splitlines()[1:])
+            if match
+        ]
+        
+        assert columns == [
+            (field.name, not field.nullable) for field in _MANUAL_CHUNKS_ARROW_SCHEMA
+        ]
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_backfills_only_when_adding_section_upper(
+        self, bigquery_client, async_stub, monkeypatch
+    ):
+        """Test the section_upper backfill is guarded by a column check."""
+        run_query = async_stub()
+        monkeypatch.setattr(bigquery_client, "_run_query", run_query)
+        
+        await bigquery_client.create_tables_if_not_exists()
+        
+        (script,), _ = run_query.calls[0]
+        check = script.index(
+            "SELECT 1 FROM `test-project.husqvarna_rag_dataset.INFORMATION_SCHEMA.COLUMNS`"
+        )
+        guard = script.index("IF add_section_upper THEN")
+        assert "table_name = 'manual_chunks'" in script[check:guard]
+        assert check < guard < script.index("ALTER TABLE") < script.index("UPDATE")
+        assert script.index("UPDATE") < script.index("END IF;")
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    @pytest.mark.parametrize("method, args", [
+        ("rebuild_vector_index", {"row_count": 1000}),
+        ("get_chunk_count", {}),
+        ("search_by_section", {"section_name": "Engine"}),
+        ("clear_table", {})
+    ])
+    async def test_rejects_unsafe_table_ids(
+        self, bigquery_client, async_stub, method, args, monkeypatch
+    ):
+        """Test table IDs are validated before being put into SQL."""
+        run_query = async_stub()
+        monkeypatch.setattr(bigquery_client, "_run_query", run_query)
+        monkeypatch.setattr(bigquery_client, "_run_query_arrow", run_query)
+        
+        with pytest.raises(ValueError, match="Invalid table ID"):
+            await getattr(bigquery_client, method)(
+                dataset_id="husqvarna_rag_dataset`; DROP TABLE x; --", **args
+            )
+        
+        assert run_query.calls == []
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_analyze_manual_sections(self, bigquery_client, async_stub, monkeypatch):
+        """Test grouping-sets rows are split into type, manual and total stats."""
+        rows = pa.table({
+            "chunk_type": ["warning", "procedure", None, None, None, None],
+            "manual_type": [None, None, "owners", "repair", None, None],
+            "all_types": [0, 0, 1, 1, 1, 0],
+            "all_manuals": [1, 1, 0, 0, 1, 1],
+            "count": [2, 6, 3, 5, 8, 1],
+            "total_length": [100, 900, 300, 700, 1000, 10]
+        })
+        # The last row is a chunk type of NULL, not a rolled-up total
+        monkeypatch.setattr(bigquery_client, "_run_query_arrow", async_stub(rows))
+        
+        analysis = await bigquery_client.analyze_manual_sections()
+        
+        assert analysis == {
+            "total_chunks": 8,
+            "by_type": {
+                "warning": {"count": 2, "avg_length": 50.0},
+                "procedure": {"count": 6, "avg_length": 150.0},
+                None: {"count": 1, "avg_length": 10.0}
+            },
+            "by_manual": {
+                "owners": {"count": 3, "avg_length": 100.0},
+                "repair": {"count": 5, "avg_length": 140.0}
+            }
+        }
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_search_by_section_matches_anywhere_in_name(
+        self, bigquery_client, async_stub, monkeypatch
+    ):
+        """Test section searches match a case-insensitive fragment, not a prefix."""
+        rows = pa.table({"id": ["chunk-1"], "subsection": ["Oil level"]})
+        run_query = async_stub(rows)
+        monkeypatch.setattr(bigquery_client, "_run_query_arrow", run_query)
+        
+        results = await bigquery_client.search_by_section("oil")
+        
+        (query, job_config), _ = run_query.calls[0]
+        assert "STRPOS(section_upper, @fragment) > 0" in query
+        assert "STARTS_WITH" not in query
+        (parameter,) = job_config.query_parameters
+        assert (parameter.name, parameter.value) == ("fragment", "OIL")
+        assert results == [{"id": "chunk-1", "subsection": "Oil level"}]
+    
+    @pytest.mark.parametrize("row_count, num_lists", [
+        (0, IVF_MIN_LISTS),
+        (10_000, 100),
+        (10**9, IVF_MAX_LISTS)
+    ])
+    def test_ivf_num_lists(self, row_count, num_lists):
+        """Test the IVF list count is sqrt(rows) within BigQuery's limits."""
+        assert _ivf_num_lists(row_count) == num_lists
+        assert IVF_MAX_LISTS <= 5000
+    
+    def test_manual_chunks_arrow_table(self):
+        """Test chunk rows are built in the declared Arrow schema."""
+        chunks = [
+            {"id": "chunk-1", "content": "Check the oil.", "section": "Maintenance"},
+            {"id": "chunk-2", "content": "Torque to 10 Nm.", "manual_type": "repair"}
+        ]
+        embeddings = np.arange(8, dtype=np.float32).reshape(2, 4)
+        
+        table = _manual_chunks_arrow_table(chunks, embeddings, datetime(2024, 1, 1))
+        
+        assert table.schema == _MANUAL_CHUNKS_ARROW_SCHEMA
+        assert table["section_upper"].to_pylist() == ["MAINTENANCE", None]
+        assert table["manual_type"].to_pylist() == ["owners", "repair"]
+        assert table["embedding"].to_pylist()[1] == [4.0, 5.0, 6.0, 7.0]
+    
+    def test_client_uses_own_pooled_session(self, monkeypatch):
+        """Test the shared client sends requests through a sized, authorized session."""
+        credentials = AnonymousCredentials()
+        default = Mock(return_value=(credentials, "test-project"))
+        monkeypatch.setattr(bigquery_client_module.google.auth, "default", default)
+        
+        # Unwrapped so the process-wide cache isn't filled with this client
+        client = get_bigquery_client.__wrapped__("test-project", "us-central1")
+        
+        default.assert_called_once_with(scopes=BIGQUERY_SCOPES)
+        assert isinstance(client._http, AuthorizedSession)
+        assert client._http.credentials is credentials
+        adapter = client._http.get_adapter("https://bigquery.googleapis.com")
+        assert adapter._pool_maxsize == HTTP_POOL_SIZE
+        assert (client.project, client.location) == ("test-project", "us-central1")
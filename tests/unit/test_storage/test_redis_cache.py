@@ -0,0 +1,55 @@
+"""
+Unit tests for the RedisCache class.
+"""
+
+import pytest
+
+from src.husqbot.storage import redis_cache as redis_cache_module
+from src.husqbot.storage.redis_cache import RedisCache
+
+_CHUNKS = [{"id": "chunk-1", "content": "Check the oil.", "similarity": 0.9}]
+
+
+class TestRedisCache:
+    """Test cases for RedisCache."""
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_round_trip_with_ttl(self, fake_redis):
+        """Test stored results are read back under the prefix with the TTL."""
+        cache = RedisCache("redis://localhost:6379/0", ttl_seconds=60)
+        
+        await cache.set_many({"a": _CHUNKS})
+        
+        assert await cache.get_many(["a", "b"]) == [_CHUNKS, None]
+        assert 0 < fake_redis.ttl("husqbot:vector_search:a") <= 60
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_clear_deletes_only_prefixed_keys(self, fake_redis, monkeypatch):
+        """Test clearing removes every cached result and nothing else."""
+        fake_redis.set("other:key", b"kept")
+        cache = RedisCache("redis://localhost:6379/0")
+        await cache.set_many({str(i): _CHUNKS for i in range(5)})
+        # Deleted across several UNLINK calls
+        monkeypatch.setattr(redis_cache_module, "CLEAR_BATCH_SIZE", 2)
+        unlink = cache.client.unlink
+        unlinked = []
+        
+        async def counting_unlink(*keys):
+            unlinked.append(len(keys))
+            return await unlink(*keys)
+        
+        monkeypatch.setattr(cache.client, "unlink", counting_unlink)
+        
+        assert await cache.clear() == 5
+        
+        assert unlinked == [2, 2, 1]
+        
+        assert fake_redis.keys() == [b"other:key"]
+        assert await cache.get_many(["0"]) == [None]
+    
+    def test_missing_dependencies_raise(self, monkeypatch):
+        """Test the cache names the requirements file when redis is missing."""
+        monkeypatch.setattr(redis_cache_module, "redis", None)
+        
+        with pytest.raises(ImportError, match="requirements-cache.txt"):
+            RedisCache("redis://localhost:6379/0")
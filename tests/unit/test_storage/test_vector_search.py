@@ -0,0 +1,180 @@
+"""
+Unit tests for the VectorSearch class.
+"""
+
+import pytest
+
+from src.husqbot.storage import vector_search as vector_search_module
+from src.husqbot.storage.vector_search import VectorSearch
+
+_EMBEDDING = [0.1] * 768
+
+
+@pytest.fixture
+def vector_search(mock_bigquery_client):
+    """VectorSearch with a local cache over the session BigQuery mock."""
+    mock_bigquery_client.reset_mock(side_effect=True)
+    mock_bigquery_client.search_similar_chunks.side_effect = (
+        lambda query_embedding, **kwargs: [{"id": f"chunk-{query_embedding[0]}"}]
+    )
+    mock_bigquery_client.search_similar_chunks_batch.side_effect = (
+        lambda query_embeddings, **kwargs: [
+            [{"id": f"chunk-{embedding[0]}"}] for embedding in query_embeddings
+        ]
+    )
+    return VectorSearch(mock_bigquery_client)
+
+
+class TestVectorSearch:
+    """Test cases for VectorSearch."""
+    
+    def test_cache_key_covers_whole_embedding(self, vector_search):
+        """Test embeddings differing only in their last value get distinct keys."""
+        other = _EMBEDDING[:-1] + [0.2]
+        
+        key = vector_search._create_cache_key(_EMBEDDING, 5, None)
+        
+        assert key == vector_search._create_cache_key(list(_EMBEDDING), 5, None)
+        assert key != vector_search._create_cache_key(other, 5, None)
+    
+    @pytest.mark.parametrize("params", [(10, None, 0.05), (5, 2, 0.05), (5, None, 0.1)])
+    def test_cache_key_covers_search_parameters(self, vector_search, params):
+        """Test each search parameter is part of the key."""
+        key = vector_search._create_cache_key(_EMBEDDING, 5, None, 0.05)
+        
+        assert key != vector_search._create_cache_key(_EMBEDDING, *params)
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_repeated_search_hits_cache(self, vector_search, mock_bigquery_client):
+        """Test a repeated search is answered from the cache and counted."""
+        first = await vector_search.search_similar_chunks(_EMBEDDING)
+        second = await vector_search.search_similar_chunks(_EMBEDDING)
+        
+        assert second == first
+        mock_bigquery_client.search_similar_chunks.assert_called_once()
+        stats = await vector_search.get_cache_stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+        assert stats["backend"] == "local"
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_cached_results_are_copies(self, vector_search):
+        """Test changing a returned result leaves the cached one intact."""
+        first = await vector_search.search_similar_chunks(_EMBEDDING)
+        first[0]["id"] = "changed"
+        (batched,) = await vector_search.search_similar_chunks_batch([_EMBEDDING])
+        batched.clear()
+        
+        assert await vector_search.search_similar_chunks(_EMBEDDING) == [{"id": "chunk-0.1"}]
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_lru_eviction(self, vector_search, mock_bigquery_client, monkeypatch):
+        """Test the least recently used search is evicted first."""
+        monkeypatch.setattr(vector_search_module, "MAX_CACHE_ENTRIES", 2)
+        a, b, c = ([value] * 768 for value in (0.1, 0.2, 0.3))
+        
+        await vector_search.search_similar_chunks(a)
+        await vector_search.search_similar_chunks(b)
+        await vector_search.search_similar_chunks(a)  # a is now most recent
+        await vector_search.search_similar_chunks(c)  # evicts b
+        await vector_search.search_similar_chunks(a)
+        await vector_search.search_similar_chunks(b)
+        
+        searched = [
+            call.kwargs["query_embedding"][0]
+            for call in mock_bigquery_client.search_similar_chunks.call_args_list
+        ]
+        assert searched == [0.1, 0.2, 0.3, 0.2]
+        assert (vector_search.cache_hits, vector_search.cache_misses) == (2, 4)
+        assert len(vector_search.cache) == 2
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_searches_only_misses(self, vector_search, mock_bigquery_client):
+        """Test a batch searches each uncached embedding once, in input order."""
+        a, b = [0.1] * 768, [0.2] * 768
+        await vector_search.search_similar_chunks(a)
+        
+        results = await vector_search.search_similar_chunks_batch([b, a, b])
+        
+        assert results == [[{"id": "chunk-0.2"}], [{"id": "chunk-0.1"}], [{"id": "chunk-0.2"}]]
+        mock_bigquery_client.search_similar_chunks_batch.assert_called_once()
+        call = mock_bigquery_client.search_similar_chunks_batch.call_args
+        assert call.kwargs["query_embeddings"] == [b]
+        assert (vector_search.cache_hits, vector_search.cache_misses) == (1, 3)
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_clear_cache(self, vector_search):
+        """Test clearing drops the entries and resets the counters."""
+        await vector_search.search_similar_chunks(_EMBEDDING)
+        
+        await vector_search.clear_cache()
+        
+        stats = await vector_search.get_cache_stats()
+        assert (stats["total_entries"], stats["hits"], stats["misses"]) == (0, 0, 0)
+        assert stats["hit_rate"] == 0.0
+
+
+@pytest.fixture
+def shared_vector_searches(mock_bigquery_client, vector_search, fake_redis):
+    """Two VectorSearch workers sharing one in-memory Redis.
+    
+    Depends on ``vector_search`` for its reset BigQuery mock.
+    """
+    return [
+        VectorSearch(mock_bigquery_client, redis_url="redis://localhost:6379/0")
+        for _ in range(2)
+    ]
+
+
+class TestSharedCache:
+    """Test cases for the Redis cache shared between workers."""
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_read_through_other_worker(
+        self, shared_vector_searches, mock_bigquery_client
+    ):
+        """Test a search cached by one worker is served to another from Redis."""
+        first, second = shared_vector_searches
+        
+        expected = await first.search_similar_chunks(_EMBEDDING)
+        (batched,) = await second.search_similar_chunks_batch([_EMBEDDING])
+        
+        assert batched == expected
+        mock_bigquery_client.search_similar_chunks.assert_called_once()
+        mock_bigquery_client.search_similar_chunks_batch.assert_not_called()
+        # Shared hits are kept locally for the next lookup
+        assert len(second.cache) == 1
+        stats = await second.get_cache_stats()
+        assert (stats["backend"], stats["hits"], stats["misses"]) == ("redis", 1, 0)
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_unreachable_redis_falls_back_to_bigquery(
+        self, shared_vector_searches, mock_bigquery_client, monkeypatch
+    ):
+        """Test Redis errors only cost the shared hits, not the search."""
+        (search, _) = shared_vector_searches
+        
+        def refuse(*args, **kwargs):
+            raise ConnectionError("Connection refused")
+        
+        async def refuse_async(*args, **kwargs):
+            refuse()
+        
+        monkeypatch.setattr(search.shared_cache.client, "mget", refuse_async)
+        monkeypatch.setattr(search.shared_cache.client, "pipeline", refuse)
+        
+        assert await search.search_similar_chunks(_EMBEDDING) == [{"id": "chunk-0.1"}]
+        mock_bigquery_client.search_similar_chunks.assert_called_once()
+    
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_clear_cache_clears_redis(
+        self, shared_vector_searches, mock_bigquery_client, fake_redis
+    ):
+        """Test clearing one worker's cache drops the shared entries too."""
+        first, second = shared_vector_searches
+        await first.search_similar_chunks(_EMBEDDING)
+        
+        await first.clear_cache()
+        await second.search_similar_chunks(_EMBEDDING)
+        
+        assert mock_bigquery_client.search_similar_chunks.call_count == 2
+        assert len(fake_redis.keys("husqbot:vector_search:*")) == 1